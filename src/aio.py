@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+try:
+    import asyncio
+except ImportError: # python 2
+    try:
+        import trollius as asyncio
+    except ImportError: # only loops given explicitly, and no futures
+        asyncio = None
+
+from core import TICKS
+from core import AlreadyStarted, NotYetStarted
+
+
+class AsyncClock(object):
+    """Drive a Core object from an asyncio event loop.
+
+    Like `DeadlineClock', schedule a single callback expiring on the next
+    phase boundary of the core object (`loop.call_at', hence the monotonic
+    clock of the loop), and move the core object forward of the time
+    actually elapsed.  Optionally, refresh the core object every `interval'
+    seconds too, e.g. to keep some countdown moving.
+
+    Phase changes can be waited for through the futures returned by
+    `next_phase'.
+    """
+
+    def __init__(self, core, loop=None, interval=None):
+        """Initializer.
+
+        Keywords:
+            core Core object to drive.
+            loop asyncio event loop (default: the current one), or any
+                object providing its `time' and `call_at' methods.
+            interval seconds between refreshes (default: no refresh).
+        """
+        self.core = core
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.interval = interval
+        self.started = None
+        self.last = None
+        self.waiters = []
+
+        core.connect('phase-fraction', self._phase_fraction_cb)
+
+    def start(self):
+        """Start to measure elapsed time.
+
+        Raise:
+            AlreadyStarted
+        """
+        if self.started is not None:
+            raise AlreadyStarted()
+        self.last = self.loop.time()
+        self._arm()
+
+    def stop(self):
+        """Move the core object forward of the time elapsed so far, and stop
+        to measure time.
+
+        Raise:
+            NotYetStarted
+        """
+        if self.started is None:
+            raise NotYetStarted()
+        self._account()
+        if self.started is not None:
+            self.started.cancel()
+            self.started = None
+
+    def next_phase(self):
+        """Return a future resolved with the (name, phase) tuple of the next
+        phase loaded by the core object.
+        """
+        future = asyncio.Future(loop=self.loop)
+        self.waiters.append(future)
+        return future
+
+    def _account(self):
+        """Move the core object forward of the time elapsed since the last
+        call.
+
+        Time is delivered in chunks never crossing a phase boundary, so that
+        handlers can stop the clock at the end of a phase.
+        """
+        ticks = int((self.loop.time() - self.last) * TICKS)
+        self.last += ticks / TICKS
+        while ticks > 0 and self.started is not None:
+            count = min(ticks, self.core.remaining())
+            ticks -= count
+            self.core.advance(count / TICKS)
+
+    def _arm(self):
+        """(Re)schedule the callback expiring on the next phase boundary.
+        """
+        if self.started is not None:
+            self.started.cancel()
+        when = self.last + self.core.remaining() / TICKS
+        if self.interval is not None:
+            when = min(when, self.loop.time() + self.interval)
+        self.started = self.loop.call_at(when, self._wake)
+
+    def _wake(self):
+        self._account()
+        if self.started is not None:
+            self._arm()
+
+    def _phase_fraction_cb(self, core, name, phase, count, ticks):
+        """Resolve waiting futures and rearm when a new phase is loaded.
+        """
+        if count != 0:
+            return
+        if not core.restoring:
+            (waiters, self.waiters) = (self.waiters, [])
+            for future in waiters:
+                if not future.done():
+                    future.set_result((name, phase))
+        if self.started is not None:
+            self._arm()
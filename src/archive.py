@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import datetime
+import glob
+import gzip
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+from history import LOG
+
+
+MONTH = re.compile(br'^\d{4}-\d{2}')
+
+
+def _segment(log, month):
+    """Return the location of the sealed segment of the given month.
+    """
+    return "%s.%s.gz" % (log, month)
+
+
+def _summary(log, month):
+    """Return the location of the summary of the given month.
+    """
+    return "%s.%s.json" % (log, month)
+
+
+def months(log=LOG):
+    """Return the sorted list of the sealed months of the history log, as
+    "YYYY-MM" strings.
+    """
+    prefix = len(log) + 1
+    return sorted(path[prefix:prefix + 7]
+                  for path in glob.glob(_summary(log, '[0-9]*-[0-9]*')))
+
+
+def split(buf, start=0):
+    """Generator returning the complete lines of a buffer.
+
+    Keywords:
+        buf buffer (e.g. mmap object) to scan.
+        start offset of the first line to return.
+    """
+    pos = start
+    while True:
+        end = buf.find(b'\n', pos)
+        if end == -1:
+            return
+        yield buf[pos:end]
+        pos = end + 1
+
+
+def records(lines):
+    """Generator returning (day, hour, label) tuples out of history lines.
+
+    Malformed lines (undecodable ones included) are silently skipped.
+    """
+    for line in lines:
+        (date, sep, label) = line.partition(b' | ')
+        if not sep or len(date) < 13:
+            continue
+        try:
+            record = (date[:10].decode('ascii'), date[11:13].decode('ascii'),
+                      label.decode('utf-8'))
+        except UnicodeDecodeError:
+            continue
+        yield record
+
+
+def decode(line, hours):
+    """Parse a line of the history log, without going through datetime.
+
+    Keywords:
+        line raw line formatted as "<date> | <label>"
+        hours dictionary caching the epoch of the hours already seen:  time
+            zone offsets only change on hour boundaries.
+
+    Return:
+        (seconds since the epoch, label) tuple.
+
+    Raise:
+        ValueError: malformed line (undecodable ones included)
+    """
+    (date, sep, label) = line.partition(b' | ')
+    if not sep or len(date) < 19:
+        raise ValueError()
+    hour = hours.get(date[:13])
+    if hour is None:
+        hour = hours[date[:13]] = int(time.mktime((
+            int(date[0:4]), int(date[5:7]), int(date[8:10]), int(date[11:13]),
+            0, 0, 0, 0, -1)))
+    return (hour + int(date[14:16]) * 60 + int(date[17:19]),
+            label.decode('utf-8'))
+
+
+def summarize(lines):
+    """Return the per day, per label and per hour counts of history lines.
+    """
+    summary = {'count': 0,
+               'days': collections.Counter(),
+               'labels': collections.Counter(),
+               'hours': collections.Counter()}
+    for (day, hour, label) in records(lines):
+        summary['count'] += 1
+        summary['days'][day] += 1
+        summary['labels'][label] += 1
+        summary['hours'][hour] += 1
+    return summary
+
+
+def load(log, month):
+    """Return the summary of a sealed month.
+    """
+    with open(_summary(log, month)) as f:
+        summary = json.load(f)
+    for key in ('days', 'labels', 'hours'):
+        summary[key] = collections.Counter(summary[key])
+    return summary
+
+
+def lines(log, month):
+    """Return the history lines of a sealed month.
+    """
+    try:
+        with gzip.open(_segment(log, month), 'rb') as f:
+            return f.read().splitlines()
+    except IOError:
+        return []
+
+
+def iterlines(log=LOG, data=None, sealed=True):
+    """Generator returning the lines of the history log, those of its sealed
+    months first.
+
+    Keywords:
+        log location of the history log.
+        data bytes of the history log to split (default: the whole log, read
+            through a memory map);  a trailing partial line is skipped.
+        sealed whether to return the lines of the sealed months.
+    """
+    if sealed:
+        for month in months(log):
+            for line in lines(log, month):
+                yield line
+    if data is not None:
+        for line in data[:data.rfind(b'\n') + 1].splitlines():
+            yield line
+        return
+    try:
+        f = open(log, 'rb')
+    except IOError:
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            for line in split(buf):
+                yield line
+        finally:
+            buf.close()
+
+
+def _seal(log, month, new):
+    """Append lines to the segment of the given month, then write its
+    summary.
+
+    Lines already sealed are skipped, hence sealing the same lines twice
+    (e.g. after a crash in the middle of a rotation) is harmless.
+    """
+    old = lines(log, month)
+    sealed = set(old)
+    merged = old + [line for line in new if line not in sealed]
+    for (path, write) in ((_segment(log, month), _write_segment),
+                          (_summary(log, month), _write_summary)):
+        tmp = path + '.tmp'
+        try:
+            write(tmp, merged)
+            os.rename(tmp, path)
+        finally:
+            # a failed write leaves no temporary file behind.
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _write_segment(path, lines):
+    with gzip.open(path, 'wb') as f:
+        f.writelines(line + b'\n' for line in lines)
+
+
+def _write_summary(path, lines):
+    with open(path, 'w') as f:
+        json.dump(summarize(lines), f, sort_keys=True)
+
+
+def rotate(log=LOG, today=None):
+    """Seal the records of the past months of the history log.
+
+    The records of each past month are moved inside a compressed segment,
+    together with a summary of their counts;  only the records of the
+    current month are left inside the history log.  Malformed lines follow
+    the record preceding them.
+
+    When the first record of the log belongs to the current month, nothing
+    is read past it.
+
+    Keywords:
+        log location of the history log.
+        today date object of the current day (default: today).
+
+    Return:
+        the sorted list of the sealed months.
+    """
+    if today is None:
+        today = datetime.date.today()
+    current = today.strftime('%Y-%m').encode('ascii')
+    try:
+        f = open(log, 'rb')
+    except IOError:
+        return []
+    with f:
+        first = f.readline()
+        if not first or first[:7] >= current:
+            return []
+        f.seek(0)
+        data = f.read()
+    # leave partially written lines inside the log.
+    end = data.rfind(b'\n') + 1
+    segments = collections.OrderedDict()
+    keep = []
+    month = None
+    for line in data[:end].splitlines():
+        if MONTH.match(line):
+            month = line[:7]
+        if month is None or month >= current:
+            keep.append(line)
+        else:
+            segments.setdefault(month, []).append(line)
+    for (month, new) in segments.items():
+        _seal(log, month.decode('ascii'), new)
+    tmp = log + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.writelines(line + b'\n' for line in keep)
+        f.write(data[end:])
+    os.rename(tmp, log)
+    # the checkpoint of the incremental stats refers to the old log.
+    try:
+        os.remove(log + '.stats')
+    except OSError:
+        pass
+    return sorted(month.decode('ascii') for month in segments)
+
+
+def counts(log=LOG, start=None, end=None):
+    """Return the per day, per label and per hour counts of the sealed
+    months, in the given period.
+
+    Months entirely inside the period are accounted through their summary;
+    only the segments of the months the period starts or ends in are
+    decompressed and parsed.
+
+    Keywords:
+        start date object of the first day (included) of the period.
+        end date object of the last day (excluded) of the period.
+    """
+    total = {'count': 0,
+             'days': collections.Counter(),
+             'labels': collections.Counter(),
+             'hours': collections.Counter()}
+    first = start.isoformat() if start is not None else None
+    last = end.isoformat() if end is not None else None
+    for month in months(log):
+        if ((last is not None and month + '-01' >= last)
+                or (first is not None and month + '-31' < first)):
+            continue
+        if ((first is None or month + '-01' >= first)
+                and (last is None or month + '-31' < last)):
+            summary = load(log, month)
+        else:
+            summary = summarize(line for line in lines(log, month)
+                                if (first is None or line[:10] >= first)
+                                and (last is None or line[:10] < last))
+        total['count'] += summary['count']
+        for key in ('days', 'labels', 'hours'):
+            total[key].update(summary[key])
+    return total
+
+
+def main(argv, out=sys.stdout):
+    """Seal all the past months of the history log.
+
+    Usage: compact [LOG]
+    """
+    log = argv[0] if argv else LOG
+    for month in rotate(log):
+        summary = load(log, month)
+        out.write("%s: %d pomodoros\n" % (month, summary['count']))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+# (name, statement) pairs of imports whose cold-start time is measured.
+IMPORTS = [('interpreter', 'pass'),
+           ('core', 'import core'),
+           ('pomodoro', 'import pomodoro'),
+           ('desktop', 'import pomodoro, gui'),
+           ('startup', 'import pomodoro, gui; gui.UI(); gui.Player()')]
+
+TOLERANCE = 0.1 # slowdown above which a benchmark is reported as regressed
+
+
+def import_time(statement, repeat=10):
+    """Return the best wall time, in seconds, spent by a fresh interpreter to
+    execute the given statement.
+
+    Keywords:
+        statement python statement to execute.
+        repeat how many interpreters to spawn.
+    """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', statement], cwd=SRC)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _core_tick(tmp):
+    import core
+    c = core.Core()
+    c.start()
+    return c.tick
+
+
+def _core_tick_handler(tmp):
+    import core
+    c = core.Core()
+    c.connect('phase-fraction', lambda core, name, phase, count, ticks: None)
+    c.start()
+    return c.tick
+
+
+def _core_tick_adapter(tmp):
+    import core
+    import mainloop
+    c = core.Core()
+    adapter = mainloop.Adapter(c)
+    adapter.connect('phase-fraction',
+                    lambda adapter, name, phase, count, ticks: None)
+    c.start()
+    return c.tick
+
+
+def _phase_fraction_emit(tmp):
+    import core
+    c = core.Core()
+    return lambda: c.emit('phase-fraction', 'work', 1, 1, 1500)
+
+
+def _phase_fraction_cb(tmp):
+    import gui
+    import pomodoro
+    ui = gui.UI()
+    renderer = gui.Renderer(ui)
+    player = gui.Player()
+    core = pomodoro.Core()
+    clk = pomodoro.DeadlineClock(core)
+    counter = iter(xrange(1, sys.maxint))
+    return lambda: pomodoro._phase_fraction_cb(core, 'work', 1,
+                                               next(counter) % 1500 or 1, 1500,
+                                               ui, renderer, player, clk,
+                                               None, None)
+
+
+def _log_writer(tmp):
+    # cost paid by the caller (i.e. the GTK thread) only:  records are
+    # written by the worker thread, outside of the measure.
+    import history
+    writer = history.Writer(os.path.join(tmp, 'writer'), fsync=False)
+    append = lambda: writer.append('benchmark')
+    append.close = writer.close
+    return append
+
+
+# (name, setup, number) triples:  setup, given a temporary directory, returns
+# the callable to measure (whose `close' attribute, if any, is invoked once
+# measured).
+BENCHMARKS = [('core_tick', _core_tick, 10000),
+              ('core_tick_handler', _core_tick_handler, 10000),
+              ('core_tick_adapter', _core_tick_adapter, 10000),
+              ('phase_fraction_emit', _phase_fraction_emit, 10000),
+              ('phase_fraction_cb', _phase_fraction_cb, 1000),
+              ('log_writer', _log_writer, 1000)]
+
+
+def run(names=None, repeat=5):
+    """Run the benchmarks, and return their results.
+
+    Benchmarks whose dependencies are not available are reported as None.
+
+    Keywords:
+        names names of the benchmarks to run (default: all of them).
+        repeat how many times to repeat each measure, keeping the best.
+
+    Return:
+        dictionary mapping benchmark names to seconds per operation.
+    """
+    results = {}
+    tmp = tempfile.mkdtemp()
+    try:
+        for (name, setup, number) in BENCHMARKS:
+            if names and name not in names:
+                continue
+            try:
+                func = setup(tmp)
+            except (ImportError, RuntimeError):
+                results[name] = None
+                continue
+            try:
+                results[name] = min(timeit.repeat(func, number=number,
+                                                  repeat=repeat)) / number
+            finally:
+                getattr(func, 'close', lambda: None)()
+    finally:
+        shutil.rmtree(tmp)
+    for (name, statement) in IMPORTS:
+        name = 'import_' + name
+        if names and name not in names:
+            continue
+        try:
+            results[name] = import_time(statement, repeat)
+        except subprocess.CalledProcessError:
+            results[name] = None
+    return results
+
+
+def compare(baseline, results, out=sys.stdout):
+    """Print a comparison between results and baseline.
+
+    Return:
+        the names of the regressed benchmarks.
+    """
+    regressed = []
+    for name in sorted(results):
+        (old, new) = (baseline.get(name), results[name])
+        if old is None or new is None:
+            out.write("%-28s %12s %12s\n" % (name, old, new))
+            continue
+        change = new / old - 1
+        flag = ''
+        if change > TOLERANCE:
+            flag = ' REGRESSED'
+            regressed.append(name)
+        out.write("%-28s %12.3g %12.3g %+7.1f%%%s\n"
+                  % (name, old, new, change * 100, flag))
+    return regressed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description='Measure the cost of the pomodoro hot paths.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run')
+    parser.add_argument('-o', '--output', help='save results as JSON')
+    parser.add_argument('-b', '--baseline', help='compare with saved results')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'results': run(args.names, args.repeat)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        return 1 if compare(baseline, report['results']) else 0
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
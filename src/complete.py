@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import collections
+import marshal
+import math
+import os
+import time
+
+import archive
+from history import HEAD, LOG
+
+
+CACHE = LOG + '.labels'
+HALFLIFE = 30 * 24 * 60 * 60 # seconds after which a use counts half
+LIMIT = 10 # suggestions kept for each prefix
+DEPTH = 64 # characters of the labels indexed by the trie
+VERSION = 1
+VOID = '#void' # label logged for pomodoros without one
+
+
+class Completer(object):
+    """Suggest past labels, given a prefix.
+
+    Labels are ranked by frecency:  each use of a label counts 1, halving
+    every `HALFLIFE' seconds.  The rank is kept relative to the epoch, so
+    that the ordering of labels does not change as time goes by, but only
+    when a label is used again (and its rank can only grow).
+
+    Labels are stored inside a prefix trie whose nodes are dictionaries,
+    mapping characters to child nodes, the empty string to the best `LIMIT'
+    labels starting with the prefix of the node, and 0 to the number of
+    such labels.  Nodes with no more than `LIMIT' labels have no children
+    (their labels are all in their top list), and are split when they grow
+    past it:  a lookup walks at most the characters of the prefix (up to
+    `DEPTH' of them), then filters a single top list.  The trie is cached on
+    disk, together with the offset of the first byte of the history log not
+    yet parsed.
+    """
+
+    def __init__(self, path=CACHE):
+        """Initializer.
+
+        Keywords:
+            path location of the cache.
+        """
+        self.path = path
+        self.reset()
+        if path is not None:
+            self.load()
+
+    def reset(self):
+        """Forget all the labels.
+        """
+        self.root = {'': [], 0: 0}
+        self.ranks = {}
+        self.offset = 0
+        self.head = ''
+        self.added = collections.Counter()
+
+    def load(self):
+        """Restore the trie from the cache, if any.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                (version, offset, head, ranks, root) = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return
+        if version == VERSION:
+            (self.offset, self.head, self.ranks, self.root) = (offset, head,
+                                                               ranks, root)
+
+    def save(self):
+        """Atomically write the trie on the cache.
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            marshal.dump((VERSION, self.offset, self.head, self.ranks,
+                          self.root), f)
+        os.rename(tmp, self.path)
+
+    def _use(self, label, when):
+        """Account a use of the label, and return its new rank.
+        """
+        (rank, score, last) = self.ranks.get(label, (None, 0, when))
+        if when >= last:
+            score = score * 2 ** ((last - when) / HALFLIFE) + 1
+            last = when
+        else:
+            score += 2 ** ((when - last) / HALFLIFE)
+        rank = math.log(score, 2) + last / HALFLIFE
+        self.ranks[label] = (rank, score, last)
+        return rank
+
+    def _rank(self, top, label, rank):
+        """Insert the label inside a top list, sorted by rank.
+        """
+        ranks = self.ranks
+        if label in top:
+            top.remove(label)
+        elif len(top) >= LIMIT and rank <= ranks[top[-1]][0]:
+            return
+        pos = len(top)
+        while pos and ranks[top[pos - 1]][0] < rank:
+            pos -= 1
+        top.insert(pos, label)
+        del top[LIMIT:]
+
+    def _insert(self, label, rank, new):
+        """Insert the label inside the top lists of all its prefixes.
+
+        Keywords:
+            label text-string label.
+            rank rank of the label.
+            new whether the label was never inserted before.
+        """
+        node = self.root
+        depth = 0
+        while True:
+            if new:
+                node[0] += 1
+            if (new and node[0] == LIMIT + 1 and len(node) == 2
+                    and depth < DEPTH):
+                # the bucket overflows:  move its labels to new children.
+                for other in node['']:
+                    if len(other) > depth:
+                        child = node.setdefault(other[depth], {'': [], 0: 0})
+                        child[0] += 1
+                        self._rank(child[''], other, self.ranks[other][0])
+            self._rank(node[''], label, rank)
+            if node[0] <= LIMIT or depth == min(len(label), DEPTH):
+                return
+            node = node.setdefault(label[depth], {'': [], 0: 0})
+            depth += 1
+
+    def add(self, label, when=None):
+        """Record a use of the given label.
+
+        Uses added this way are skipped when found again inside the history
+        log by `update'.
+
+        Keywords:
+            label text-string label.
+            when seconds since the epoch of the use (default: now).
+        """
+        if not label or label == VOID:
+            return
+        when = int(time.time() if when is None else when)
+        new = label not in self.ranks
+        self._insert(label, self._use(label, when), new)
+        self.added[when, label] += 1
+
+    def update(self, log=LOG):
+        """Record the labels appended to the history log since last update.
+
+        A log whose first bytes changed (e.g. rotated) is parsed again from
+        scratch, sealed months included.
+
+        Keywords:
+            log location of the history log.
+
+        Return:
+            the number of parsed records.
+        """
+        try:
+            f = open(log, 'rb')
+        except IOError:
+            return 0
+        with f:
+            head = f.read(HEAD).decode('utf-8', 'replace')
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.offset or head[:len(self.head)] != self.head:
+                added = self.added
+                self.reset()
+                self.added = added
+            f.seek(self.offset)
+            data = f.read()
+        # leave partially written lines for the next update.
+        data = data[:data.rfind(b'\n') + 1]
+        touched = set()
+        new = set()
+        hours = {}
+        count = 0
+        for line in archive.iterlines(log, data, sealed=self.offset == 0):
+            try:
+                (when, label) = archive.decode(line, hours)
+            except ValueError:
+                continue
+            count += 1
+            if label == VOID:
+                continue
+            if self.added[when, label]:
+                self.added[when, label] -= 1
+                continue
+            if label not in self.ranks:
+                new.add(label)
+            self._use(label, when)
+            touched.add(label)
+        # best labels first:  most of the others will not make it into the
+        # top lists, and are skipped early.
+        for label in sorted(touched, key=lambda l: self.ranks[l][0],
+                            reverse=True):
+            self._insert(label, self.ranks[label][0], label in new)
+        self.offset += len(data)
+        if len(head) > len(self.head):
+            self.head = head
+        return count
+
+    def complete(self, prefix, limit=LIMIT):
+        """Return the best labels starting with the given prefix.
+        """
+        node = self.root
+        for c in prefix[:DEPTH]:
+            if node[0] <= LIMIT:
+                break
+            node = node.get(c)
+            if node is None:
+                return []
+        return [l for l in node[''] if l.startswith(prefix)][:limit]
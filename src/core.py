@@ -0,0 +1,613 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import array
+import bisect
+import itertools
+import time
+import traceback
+
+
+TICKS = 1 # number of ticks per second
+WORK = 25 * 60 # in seconds
+BREAK = 5 * 60 # in seconds
+COFFEE = 10 * 60 # in seconds
+RESYNC = 60 # seconds between checks for system suspensions
+
+
+def _clock_gettime(name, clk_id):
+    """Return a function reading the given POSIX clock, or None.
+
+    Keywords:
+        name name of the clock constant inside the time module.
+        clk_id value of the clock constant on Linux, used through ctypes
+               when the time module does not support the clock.
+    """
+    if hasattr(time, name) and hasattr(time, 'clock_gettime'): # python >= 3.3
+        clk_id = getattr(time, name)
+        return lambda: time.clock_gettime(clk_id)
+    try:
+        import ctypes
+        # symbols of the running process, libc included (cheaper than
+        # ctypes.util.find_library, which spawns ldconfig)
+        libc = ctypes.CDLL(None, use_errno=True)
+    except (ImportError, OSError):
+        return None
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    ts = timespec()
+    try:
+        if libc.clock_gettime(clk_id, ctypes.byref(ts)) != 0:
+            return None
+    except AttributeError:
+        return None
+
+    def clock():
+        libc.clock_gettime(clk_id, ctypes.byref(ts))
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return clock
+
+
+# monotonic clock, not counting the time the system is suspended
+monotonic = (getattr(time, 'monotonic', None)
+             or _clock_gettime('CLOCK_MONOTONIC', 1)
+             or time.time)
+# monotonic clock, counting the time the system is suspended
+boottime = _clock_gettime('CLOCK_BOOTTIME', 7) or monotonic
+
+
+class AlreadyStarted(Exception):
+    """Raised when users try to start startable objects more than once.
+    """
+    pass
+
+class NotYetStarted(Exception):
+    """Raised when users try to stop objects not yet started.
+    """
+    pass
+
+
+_handler_ids = itertools.count(1)
+
+
+class Emitter(object):
+    """Pure python signals, dispatched without any GObject marshalling.
+
+    Subclasses list their signals inside `__signals__';  handlers are
+    connected and invoked like GObject ones:  they receive the emitter, the
+    arguments of the signal and the extra arguments given to `connect'.
+
+    Handlers of each signal are kept inside a tuple, replaced on every
+    (dis)connection:  handlers can be (dis)connected while the signal is
+    being emitted.  As with GObject, an exception raised by a handler is
+    printed on stderr, and the following handlers are invoked anyway.
+    """
+
+    __slots__ = ('_handlers',)
+    __signals__ = ()
+
+    def __init__(self):
+        self._handlers = dict((name, ()) for name in self.__signals__)
+
+    def connect(self, name, callback, *args):
+        """Connect a handler to the signal with the given name.
+
+        Return:
+            the id of the handler.
+
+        Raise:
+            TypeError: unknown signal
+        """
+        if name not in self._handlers:
+            raise TypeError("unknown signal name: %s" % (name,))
+        handler_id = next(_handler_ids)
+        self._handlers[name] += ((handler_id, callback, args),)
+        return handler_id
+
+    def disconnect(self, handler_id):
+        """Disconnect the handler with the given id.
+        """
+        for (name, handlers) in self._handlers.items():
+            self._handlers[name] = tuple(h for h in handlers
+                                         if h[0] != handler_id)
+
+    handler_disconnect = disconnect
+
+    def emit(self, name, *args):
+        """Invoke the handlers of the signal with the given name.
+        """
+        for (handler_id, callback, extra) in self._handlers[name]:
+            try:
+                callback(self, *(args + extra))
+            except Exception:
+                traceback.print_exc()
+
+
+class TimingWheel(object):
+    """Hierarchical timing wheel.
+
+    Scheduled timers are stored inside the slots of a few wheels of
+    increasing resolution: timers expiring within `SLOTS' ticks live in the
+    first wheel, timers expiring within `SLOTS' ** 2 ticks in the second
+    one, and so on.  Every tick processes a single slot of the first wheel,
+    and every `SLOTS' ticks the timers of a slot of the next wheel are
+    moved down to the previous one.  Timers scheduled beyond the range of
+    the last wheel are parked in there, and rescheduled when reached.
+
+    Scheduling and cancelling a timer costs O(1), as does a tick, amortized.
+    """
+
+    BITS = 6
+    SLOTS = 1 << BITS
+    MASK = SLOTS - 1
+
+    def __init__(self, levels=4):
+        """Initializer.
+
+        Keywords:
+            levels number of wheels.
+        """
+        self.now = 0
+        self.wheels = [[set() for i in xrange(self.SLOTS)]
+                       for j in xrange(levels)]
+
+    def _insert(self, timer):
+        delta = timer.expiry - self.now
+        for (level, wheel) in enumerate(self.wheels):
+            if delta < 1 << (self.BITS * (level + 1)):
+                break
+        slot = wheel[(timer.expiry >> (self.BITS * level)) & self.MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def schedule(self, timer, ticks):
+        """Schedule the timer to expire after the given number of ticks.
+
+        Keywords:
+            timer object with `expiry' and `slot' attributes, and an
+                  `_expired' method invoked on expiration.
+            ticks how many ticks to wait before to expire the timer.
+        """
+        self.cancel(timer)
+        timer.expiry = self.now + ticks
+        self._insert(timer)
+
+    def cancel(self, timer):
+        """Unschedule the timer, if scheduled.
+        """
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+
+    def tick(self):
+        """Move the wheels forward of a tick, and expire due timers.
+        """
+        self.now += 1
+        now = self.now
+        level = 1
+        while (level < len(self.wheels)
+               and not now & ((1 << (self.BITS * level)) - 1)):
+            level += 1
+        # cascade from the top, as slots of lower wheels might be refilled.
+        for level in xrange(level - 1, 0, -1):
+            wheel = self.wheels[level]
+            index = (now >> (self.BITS * level)) & self.MASK
+            (slot, wheel[index]) = (wheel[index], set())
+            for timer in slot:
+                self._insert(timer)
+        wheel = self.wheels[0]
+        index = now & self.MASK
+        (slot, wheel[index]) = (wheel[index], set())
+        for timer in slot:
+            timer.slot = None
+            if timer.expiry <= now:
+                timer._expired()
+            else:
+                # parked beyond the range of the last wheel.
+                self._insert(timer)
+
+
+class Timer(Emitter):
+    """Count incoming ticks and emit a signals.
+
+    The timer is a handle on a timing wheel, shared with other timers.  A
+    timer owning its wheel is armed since its creation;  timers sharing a
+    wheel only count ticks while armed.
+    """
+
+    __slots__ = ('ticks', 'expiry', 'slot', 'elapsed', 'armed', 'wheel')
+    __signals__ = ('fire',)
+
+    def __init__(self, ticks, wheel=None):
+        """Initializer.
+
+        Keywords:
+            ticks how many ticks to wait before to emit the signal.
+            wheel TimingWheel object to use (default: a private one)
+
+        Raise:
+            ValueError: ticks <= 0
+        """
+        super(Timer, self).__init__()
+
+        if ticks <= 0:
+            raise ValueError()
+        self.ticks = ticks
+        self.expiry = None
+        self.slot = None
+        self.elapsed = 0
+        self.armed = False
+        if wheel is None:
+            self.wheel = TimingWheel()
+            self.arm()
+        else:
+            self.wheel = wheel
+
+    @property
+    def count(self):
+        if self.armed:
+            return self.ticks - (self.expiry - self.wheel.now)
+        return self.elapsed
+
+    @count.setter
+    def count(self, count):
+        self.elapsed = count
+        if self.armed:
+            self.wheel.schedule(self, self.ticks - count)
+
+    def arm(self):
+        """Start to count the ticks of the wheel.
+        """
+        if not self.armed:
+            self.armed = True
+            self.wheel.schedule(self, self.ticks - self.elapsed)
+
+    def disarm(self):
+        """Stop to count the ticks of the wheel, retaining the tick counter.
+        """
+        if self.armed:
+            self.elapsed = self.count
+            self.armed = False
+            self.wheel.cancel(self)
+
+    def _expired(self):
+        """Emit a signal, and start counting from scratch.
+        """
+        self.wheel.schedule(self, self.ticks)
+        self.emit('fire')
+
+    def tick(self):
+        """Tick the wheel, hence increment the tick counter and emit a signal
+        on overflow.
+        """
+        self.wheel.tick()
+
+    def reset(self, ticks=None):
+        """Reset tick counter and, optionally, the tick threshold.
+
+        Keywords:
+            ticks how many ticks to wait before to emit a signal.
+
+        Raise:
+            ValueError: ticks <= 0
+        """
+        if ticks is not None:
+            if ticks <= 0:
+                raise ValueError()
+            self.ticks = ticks
+        self.count = 0
+
+
+class Schedule(object):
+    """Cycle of phases, compiled into a table of durations.
+
+    Each position of the cycle has a name and a duration;  a new phase
+    starts every time the name of the first position comes back (e.g. with
+    the default schedule, every `work' starts a new phase).  Durations are
+    stored in ticks, together with their prefix sums, hence locating the
+    position at a given offset from the beginning of the cycle is a binary
+    search.
+    """
+
+    __slots__ = ('names', 'durations', 'offsets', 'phases', 'count', 'total')
+
+    def __init__(self, steps):
+        """Initializer.
+
+        Keywords:
+            steps sequence of (name, seconds) pairs.
+
+        Raise:
+            ValueError: empty schedule, or seconds <= 0
+        """
+        if not steps:
+            raise ValueError()
+        self.names = tuple(name for (name, seconds) in steps)
+        self.durations = array.array('l')
+        self.offsets = array.array('l')
+        self.phases = array.array('l')
+        total = 0
+        phase = 0
+        for (name, seconds) in steps:
+            ticks = int(round(seconds * TICKS))
+            if ticks <= 0:
+                raise ValueError()
+            if name == self.names[0]:
+                phase += 1
+            self.durations.append(ticks)
+            self.offsets.append(total)
+            self.phases.append(phase)
+            total += ticks
+        self.count = phase
+        self.total = total
+
+    @classmethod
+    def parse(cls, text):
+        """Compile a schedule out of its textual representation.
+
+        Positions are separated by commas or newlines, and are made of a
+        name followed by a duration in minutes, e.g.:
+        "work 25, break 5, work 25, break 5, work 25, coffee 15".
+        Text following a `#' is ignored.
+
+        Raise:
+            ValueError: malformed text
+        """
+        steps = []
+        for line in text.splitlines():
+            for step in line.split('#', 1)[0].split(','):
+                if not step.strip():
+                    continue
+                (name, minutes) = step.split()
+                steps.append((name, float(minutes) * 60))
+        return cls(steps)
+
+    def __len__(self):
+        return len(self.names)
+
+    def locate(self, offset):
+        """Return the position at the given offset from the beginning of the
+        cycle.
+
+        Keywords:
+            offset number of ticks, possibly spanning multiple cycles.
+
+        Return:
+            (index, count) tuple of the position inside the cycle, and of the
+            number of ticks elapsed since its beginning.
+        """
+        offset %= self.total
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        return (index, offset - self.offsets[index])
+
+
+# Phase 1/4: work, break.
+# Phase 2/4: work, break.
+# Phase 3/4: work, break.
+# Phase 4/4: work, coffee.
+DEFAULT = Schedule([('work', WORK), ('break', BREAK)] * 3
+                   + [('work', WORK), ('coffee', COFFEE)])
+
+
+class Core(Emitter):
+    """Core object of the pomodoro tracker.
+
+    The object periodically emit signals to notify the status of the current
+    session:
+    - name of the current session [ 'work', 'break', 'coffee' ]
+    - how many pomodoros have you done since last long break?
+    - how many elapsed ticks since the beginning of the current session?
+    - how many ticks count the current session?
+    """
+
+    __slots__ = ('schedule', 'wheel', 'timers', 'current', 'phase', 'index',
+                 'restoring')
+    __signals__ = ('phase-fraction',)
+
+    def __init__(self, schedule=DEFAULT):
+        """Initializer.
+
+        Keywords:
+            schedule Schedule object describing the cycle of phases.
+        """
+        super(Core, self).__init__()
+
+        self.schedule = schedule
+        self.wheel = TimingWheel()
+        self.timers = {}
+        for (name, ticks) in zip(schedule.names, schedule.durations):
+            if name not in self.timers:
+                self.timers[name] = Timer(ticks, self.wheel)
+        self.current = None
+        self.phase = 0
+        self.index = None
+        self.restoring = False
+
+        for timer in self.timers.values():
+            timer.connect('fire', self._fire_cb)
+
+    def _load(self, index, count=0):
+        """Load the timer of the given position inside the cycle.
+
+        Keywords:
+            index position inside the cycle.
+            count number of ticks already elapsed.
+
+        Return:
+            the loaded timer.
+        """
+        if self.current is not None:
+            self.timers[self.current].reset()
+            self.timers[self.current].disarm()
+        self.index = index
+        self.current = self.schedule.names[index]
+        self.phase = self.schedule.phases[index]
+        timer = self.timers[self.current]
+        timer.reset(self.schedule.durations[index])
+        timer.count = count
+        timer.arm()
+        return timer
+
+    def _fire_cb(self, timer):
+        """Emit a signal to notify the beginning of a new phase.
+        """
+        timer = self._load((self.index + 1) % len(self.schedule))
+        self.emit('phase-fraction', self.current, self.phase, timer.count,
+                  timer.ticks)
+
+    def start(self):
+        """Load a timer, and start to receive ticks.
+
+        Raise:
+            AlreadyStarted
+        """
+        if self.current is not None:
+            raise AlreadyStarted()
+        timer = self._load(0)
+        self.emit('phase-fraction', self.current, self.phase, timer.count,
+                  timer.ticks)
+
+    def tick(self):
+        """Route the tick to the active timer, through the timing wheel.
+
+        When a timer reach its limit, then we have to select the next one.
+
+        Raise:
+            NotYetStarted
+        """
+        if self.current is None:
+            raise NotYetStarted()
+        timer = self.timers[self.current]
+        # emit the signal before to tick the timer in orde to prevent
+        # race conditions between signals.
+        self.emit('phase-fraction', self.current, self.phase,
+                  (timer.count + 1), timer.ticks)
+        self.wheel.tick()
+
+    def advance(self, seconds, boundaries=True):
+        """Move forward the current session by the given amount of time.
+
+        Instead of routing every single tick through the timers, locate the
+        resulting position inside the schedule.  A couple of `phase-fraction'
+        signals (end of the old phase, beginning of the new one) are emitted
+        for each phase boundary crossed, followed by a single one notifying
+        the final fraction.
+
+        When `boundaries' is False, crossed phase boundaries are not notified
+        at all, and whole cycles are skipped in constant time.  Amounts of
+        time rounding to no tick do not emit anything.
+
+        Keywords:
+            seconds amount of time to move forward.
+            boundaries whether to notify crossed phase boundaries.
+
+        Raise:
+            NotYetStarted
+            ValueError: seconds < 0
+        """
+        if self.current is None:
+            raise NotYetStarted()
+        if seconds < 0:
+            raise ValueError()
+        ticks = int(round(seconds * TICKS))
+        if not ticks:
+            return
+        timer = self.timers[self.current]
+        if boundaries:
+            crossed = False
+            while ticks >= timer.ticks - timer.count:
+                ticks -= timer.ticks - timer.count
+                self.emit('phase-fraction', self.current, self.phase,
+                          timer.ticks, timer.ticks)
+                self._fire_cb(timer)
+                timer = self.timers[self.current]
+                crossed = True
+            if crossed and not ticks:
+                return
+            timer.count += ticks
+        else:
+            (index, count) = self.schedule.locate(
+                self.schedule.offsets[self.index] + timer.count + ticks)
+            timer = self._load(index, count)
+        self.emit('phase-fraction', self.current, self.phase, timer.count,
+                  timer.ticks)
+
+    def stop(self):
+        """Reset the current timer and set self.current to None.
+
+        Raise:
+            NotYetStarted
+        """
+        if self.current is None:
+            raise NotYetStarted()
+        self.timers[self.current].reset()
+        self.timers[self.current].disarm()
+        self.current = None
+        self.phase = 0
+        self.index = None
+
+    def skip(self):
+        """Skip the current pomodoro phase.
+
+        Raise:
+            NotYetStarted
+        """
+        if self.current is None:
+            raise NotYetStarted()
+        self._fire_cb(self.timers[self.current])
+
+    def remaining(self):
+        """Return the number of ticks left before the current phase ends.
+
+        Raise:
+            NotYetStarted
+        """
+        if self.current is None:
+            raise NotYetStarted()
+        timer = self.timers[self.current]
+        return timer.ticks - timer.count
+
+    @property
+    def state(self):
+        """Serializable state of the object:  (index, phase, count) tuple of
+        the position inside the cycle, the index of the current phase, and
+        the number of elapsed ticks of the current timer.
+
+        The index is None while the object is stopped.
+        """
+        if self.current is None:
+            return (None, 0, 0)
+        return (self.index, self.phase, self.timers[self.current].count)
+
+    def set_state(self, index, phase, count):
+        """Restore a state previously returned by `state'.
+
+        The restored state is notified by a `phase-fraction' signal, during
+        which `restoring' is True:  with a count of 0, handlers can tell a
+        restored phase from one just begun.
+
+        Keywords:
+            index position inside the cycle, None to stop the object.
+            phase index of the current phase.
+            count number of elapsed ticks of the current timer.
+
+        Raise:
+            ValueError: invalid state
+        """
+        if index is None:
+            if self.current is not None:
+                self.stop()
+            return
+        if (not 0 <= index < len(self.schedule)
+                or phase != self.schedule.phases[index]
+                or not 0 <= count < self.schedule.durations[index]):
+            raise ValueError()
+        timer = self._load(index, count)
+        self.restoring = True
+        try:
+            self.emit('phase-fraction', self.current, self.phase, timer.count,
+                      timer.ticks)
+        finally:
+            self.restoring = False
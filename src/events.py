@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import datetime
+import os
+import struct
+import sys
+import time
+
+from core import TICKS
+from core import DEFAULT
+from history import LOG
+
+
+EVENTS = LOG + '.events'
+
+# time at which the event happened (seconds since the epoch), event code
+LAYOUT = struct.Struct('<dB')
+
+BEGIN = 1
+SUSPEND = 2
+SKIP = 3
+CLOSE = 4
+
+# UI signals recorded, and their event codes.
+SIGNALS = {'begin': BEGIN, 'suspend': SUSPEND, 'skip': SKIP, 'close': CLOSE}
+
+
+def record(event, when=None, path=EVENTS):
+    """Append an event to the event log.
+
+    Each event is written with a single `write' on a file opened in append
+    mode, hence concurrent writers never interleave their records.
+
+    Keywords:
+        event event code.
+        when time at which the event happened (default: now).
+        path location of the event log.
+    """
+    if when is None:
+        when = time.time()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, LAYOUT.pack(when, event))
+    finally:
+        os.close(fd)
+
+
+def read(path=EVENTS):
+    """Generator returning the (when, event) tuples of the event log.
+
+    A partially written trailing record is silently skipped.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except IOError:
+        return
+    for offset in xrange(0, len(data) - LAYOUT.size + 1, LAYOUT.size):
+        yield LAYOUT.unpack_from(data, offset)
+
+
+class Recorder(object):
+    """Record the events emitted by a UI object inside the event log.
+    """
+
+    def __init__(self, ui, path=EVENTS, clock=time.time):
+        """Initializer.
+
+        Keywords:
+            ui UI object to record.
+            path location of the event log.
+            clock function returning the current time, in seconds since the
+                epoch.
+        """
+        self.path = path
+        self.clock = clock
+
+        for (name, event) in SIGNALS.items():
+            ui.connect(name, self._event_cb, event)
+
+    def _event_cb(self, ui, event):
+        record(event, self.clock(), self.path)
+
+
+class Replay(object):
+    """Rebuild the timeline of the phases out of a stream of events.
+
+    The events are fed through a state machine mimicking the desktop
+    application (a `Core' object driven by a clock), on virtual time:  no
+    timer is involved, and the time elapsed between two events is accounted
+    in one step per phase boundary crossed.
+
+    The timeline is a list of (name, phase, start, end, elapsed, total,
+    outcome) tuples, one for each phase left, where:
+    - `start' and `end' are the times the phase was loaded and left
+    - `elapsed' is the number of seconds the phase actually run
+    - `total' is the duration of the phase, in seconds
+    - `outcome' is either 'done' or 'skipped'
+    """
+
+    def __init__(self, schedule=DEFAULT):
+        """Initializer.
+
+        Keywords:
+            schedule Schedule object used by the recorded application.
+        """
+        self.schedule = schedule
+        self.index = None
+        self.start = None
+        self.elapsed = 0
+        self.last = None
+        self.timeline = []
+
+    @property
+    def running(self):
+        return self.last is not None
+
+    def _load(self, index, when):
+        self.index = index
+        self.start = when
+        self.elapsed = 0
+
+    def _leave(self, when, outcome):
+        index = self.index
+        self.timeline.append((self.schedule.names[index],
+                              self.schedule.phases[index], self.start, when,
+                              self.elapsed,
+                              self.schedule.durations[index] / TICKS, outcome))
+
+    def _account(self, now):
+        """Move forward the running phase up to the given time.
+
+        At the end of a break the next pomodoro is loaded but suspended, as
+        the desktop application does.
+        """
+        schedule = self.schedule
+        while self.last is not None:
+            total = schedule.durations[self.index] / TICKS
+            end = self.last + total - self.elapsed
+            if end > now:
+                self.elapsed += now - self.last
+                self.last = now
+                return
+            self.elapsed = total
+            self._leave(end, 'done')
+            self._load((self.index + 1) % len(schedule), end)
+            if schedule.names[self.index] == schedule.names[0]:
+                self.last = None
+            else:
+                self.last = end
+
+    def feed(self, when, event):
+        """Apply an event.
+
+        Keywords:
+            when time at which the event happened.
+            event event code.
+        """
+        self._account(when)
+        if event == BEGIN:
+            if self.index is None:
+                self._load(0, when)
+            if self.last is None:
+                self.last = when
+        elif event in (SUSPEND, CLOSE):
+            self.last = None
+        elif event == SKIP and self.index is not None:
+            self._leave(when, 'skipped')
+            self._load((self.index + 1) % len(self.schedule), when)
+            if self.last is not None:
+                self.last = when
+
+    def run(self, events, now=None):
+        """Feed a stream of events.
+
+        Keywords:
+            events iterable of (when, event) tuples, sorted by time.
+            now time up to which to move forward the running phase, if any.
+
+        Return:
+            the timeline.
+        """
+        feed = self.feed
+        for (when, event) in events:
+            feed(when, event)
+        if now is not None:
+            self._account(now)
+        return self.timeline
+
+
+def main(argv, out=sys.stdout, schedule=DEFAULT):
+    """Print the timeline of the phases recorded inside the event log,
+    followed by the time spent and skipped per phase name.
+
+    Usage: replay [EVENTS]
+    """
+    path = argv[0] if argv else EVENTS
+    timeline = Replay(schedule).run(read(path))
+    spent = {}
+    skipped = {}
+    for (name, phase, start, end, elapsed, total, outcome) in timeline:
+        out.write("%s %s %-6s %d %5ds/%ds %s\n"
+                  % (datetime.datetime.fromtimestamp(start),
+                     datetime.datetime.fromtimestamp(end),
+                     name, phase, elapsed, total, outcome))
+        spent[name] = spent.get(name, 0) + elapsed
+        if outcome == 'skipped':
+            skipped[name] = skipped.get(name, 0) + total - elapsed
+    for name in sorted(spent):
+        out.write("%s: %ds spent, %ds skipped\n"
+                  % (name, spent[name], skipped.get(name, 0)))
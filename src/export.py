@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import array
+import json
+import os
+import sys
+
+import archive
+from history import HEAD, LOG
+
+
+COLUMNS = LOG + '.columns'
+
+# typecode of 8 bytes integers (python 2 arrays have no 'q')
+INT64 = 'q' if 'q' in getattr(array, 'typecodes', '') else 'l'
+assert array.array(INT64).itemsize == 8
+UINT32 = 'I'
+assert array.array(UINT32).itemsize == 4
+
+ENDIAN = '<' if sys.byteorder == 'little' else '>'
+
+
+class Exporter(object):
+    """Export the history log as columns of fixed size values.
+
+    - `timestamps': seconds since the epoch, as 8 bytes signed integers
+    - `labels': label ids, as 4 bytes unsigned integers
+    - `labels.txt': one label per line, the n-th being the label of id n
+    - `meta.json': number of records and labels, offset of the first byte
+      of the log not yet exported, and the types of the columns (in NumPy
+      notation)
+
+    Columns can be memory mapped as they are (e.g. by numpy.memmap).  Only
+    the records appended since the last export are parsed and appended to
+    the columns;  the metadata are written last, hence columns grown past
+    them by an interrupted export are truncated on the next one.
+    """
+
+    def __init__(self, directory=COLUMNS):
+        """Initializer.
+
+        Keywords:
+            directory location of the columns.
+        """
+        self.directory = directory
+        self.count = 0
+        self.offset = 0
+        self.head = ''
+        self.table = 0
+        self.labels = []
+        self.ids = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        try:
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+            with open(self._path('labels.txt'), 'rb') as f:
+                labels = f.read().decode('utf-8').split('\n')
+        except (IOError, ValueError):
+            return
+        self.count = meta['count']
+        self.offset = meta['offset']
+        self.head = meta['head']
+        self.table = meta['table']
+        self.labels = labels[:meta['labels']]
+        self.ids = dict((label, i) for (i, label) in enumerate(self.labels))
+
+    def reset(self):
+        """Forget all the exported records.
+        """
+        self.count = 0
+        self.offset = 0
+        self.head = ''
+        self.table = 0
+        self.labels = []
+        self.ids = {}
+
+    def _truncate(self):
+        """Drop whatever was appended past the metadata.
+        """
+        for (name, size) in (('timestamps', self.count * 8),
+                             ('labels', self.count * 4),
+                             ('labels.txt', self.table)):
+            with open(self._path(name), 'ab') as f:
+                f.truncate(size)
+
+    def update(self, log=LOG):
+        """Export the records appended to the history log since last update.
+
+        A log whose first bytes changed (e.g. rotated) is exported again from
+        scratch, sealed months included.
+
+        Keywords:
+            log location of the history log.
+
+        Return:
+            the number of exported records.
+        """
+        try:
+            f = open(log, 'rb')
+        except IOError:
+            return 0
+        with f:
+            head = f.read(HEAD).decode('utf-8', 'replace')
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.offset or head[:len(self.head)] != self.head:
+                self.reset()
+            f.seek(self.offset)
+            data = f.read()
+        # leave partially written lines for the next update.
+        data = data[:data.rfind(b'\n') + 1]
+        self._truncate()
+        timestamps = array.array(INT64)
+        ids = array.array(UINT32)
+        new = []
+        hours = {}
+        for line in archive.iterlines(log, data, sealed=self.offset == 0):
+            try:
+                (seconds, label) = archive.decode(line, hours)
+            except ValueError:
+                continue
+            i = self.ids.get(label)
+            if i is None:
+                i = self.ids[label] = len(self.labels)
+                self.labels.append(label)
+                new.append(label)
+            timestamps.append(seconds)
+            ids.append(i)
+        with open(self._path('timestamps'), 'ab') as f:
+            timestamps.tofile(f)
+        with open(self._path('labels'), 'ab') as f:
+            ids.tofile(f)
+        table = b''.join((label + u'\n').encode('utf-8') for label in new)
+        with open(self._path('labels.txt'), 'ab') as f:
+            f.write(table)
+        self.table += len(table)
+        self.count += len(timestamps)
+        self.offset += len(data)
+        if len(head) > len(self.head):
+            self.head = head
+        self._save()
+        return len(timestamps)
+
+    def _save(self):
+        """Atomically write the metadata.
+        """
+        tmp = self._path('meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'count': self.count,
+                       'labels': len(self.labels),
+                       'offset': self.offset,
+                       'head': self.head,
+                       'table': self.table,
+                       'columns': {'timestamps': ENDIAN + 'i8',
+                                   'labels': ENDIAN + 'u4'}}, f)
+        os.rename(tmp, self._path('meta.json'))
+
+    def columns(self):
+        """Return the exported (timestamps, label ids) arrays.
+        """
+        result = []
+        for (name, typecode) in (('timestamps', INT64), ('labels', UINT32)):
+            column = array.array(typecode)
+            with open(self._path(name), 'rb') as f:
+                column.fromfile(f, self.count)
+            result.append(column)
+        return tuple(result)
+
+
+def main(argv, out=sys.stdout):
+    """Export the history log as columns.
+
+    Usage: export [LOG [DIRECTORY]]
+    """
+    log = argv[0] if argv else LOG
+    directory = argv[1] if argv[1:] else log + '.columns'
+    exporter = Exporter(directory)
+    count = exporter.update(log)
+    out.write("%d new records, %d records, %d labels\n"
+              % (count, exporter.count, len(exporter.labels)))
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import array
+import math
+
+import gobject
+import gtk
+
+try:
+    import pygame
+    assert pygame.__version__ >= '1.8'
+except (ImportError, AssertionError, AttributeError):
+    raise ImportError('PyGame 1.8 or more recent required')
+
+from core import AlreadyStarted, NotYetStarted
+
+
+IDLE = 30 # seconds of silence before closing the audio mixer
+MIXER = (22050, -16, 1) # frequency, sample size and channels of the mixer
+
+# (frequency, seconds) notes of the cue played at the beginning of each phase.
+TONES = {'work': [(659, 0.12), (880, 0.12), (1319, 0.24)],
+         'break': [(1319, 0.12), (880, 0.12), (659, 0.24)],
+         'coffee': [(523, 0.15), (659, 0.15), (784, 0.15), (1047, 0.3)]}
+TONE = [(880, 0.3)] # cue of phases not listed above
+
+
+class UI(gobject.GObject):
+    """User interface.
+    """
+
+    __gsignals__ = {
+        'begin': (gobject.SIGNAL_RUN_FIRST, None, ()),
+        'suspend': (gobject.SIGNAL_RUN_FIRST, None, ()),
+        'skip': (gobject.SIGNAL_RUN_FIRST, None, ()),
+        'close': (gobject.SIGNAL_RUN_FIRST, None, ()),
+        'visible': (gobject.SIGNAL_RUN_FIRST, None,
+                    (gobject.TYPE_BOOLEAN, # is the window visible?
+                    )),
+    }
+
+    def __init__(self):
+        super(UI, self).__init__()
+
+        self.window = gtk.Window()
+        self.window.connect('delete-event', self._delete_cb)
+        self.window.connect('map-event', self._map_cb)
+        self.window.connect('unmap-event', self._unmap_cb)
+        self.window.connect('window-state-event', self._window_state_cb)
+
+        vbox = gtk.VBox(homogeneous=False)
+
+        hbox = gtk.HBox(homogeneous=False)
+
+        self.progressbar = gtk.ProgressBar()
+
+        play_img = gtk.Image()
+        play_img.set_from_stock(gtk.STOCK_MEDIA_PLAY,
+                                gtk.ICON_SIZE_LARGE_TOOLBAR)
+        pause_img = gtk.Image()
+        pause_img.set_from_stock(gtk.STOCK_MEDIA_PAUSE,
+                                 gtk.ICON_SIZE_LARGE_TOOLBAR)
+        skip_img = gtk.Image()
+        skip_img.set_from_stock(gtk.STOCK_MEDIA_NEXT,
+                                gtk.ICON_SIZE_LARGE_TOOLBAR)
+        self.images = {'play': play_img,
+                       'pause': pause_img,
+                       'skip': skip_img
+                      }
+        [widget.show() for widget in self.images.values()]
+
+        self.buttons = dict()
+        self.buttons['begin'] = gtk.Button()
+        self.buttons['begin'].add(self.images['play'])
+        self.buttons['begin'].connect('clicked', self._clicked_cb)
+        hbox.pack_start(self.buttons['begin'], False, False)
+
+        self.buttons['skip'] = gtk.Button()
+        self.buttons['skip'].add(self.images['skip'])
+        self.buttons['skip'].connect('clicked', self._clicked_cb)
+        hbox.pack_start(self.buttons['skip'], False, False)
+
+        vbox.pack_start(hbox, True, True)
+
+        self.entry = gtk.Entry()
+        vbox.pack_start(self.entry, False, False)
+        self.completer = None
+        self.completion = None
+
+        hbox.pack_start(self.progressbar)
+        self.window.add(vbox)
+        self.window.show_all()
+
+    def _delete_cb(self, window, event):
+        """The window has been closed, so emit the proper signal.
+        """
+        self.emit('close')
+
+    def _map_cb(self, window, event):
+        """The window has been mapped, so emit the proper signal.
+        """
+        self.emit('visible', True)
+
+    def _unmap_cb(self, window, event):
+        """The window has been unmapped, so emit the proper signal.
+        """
+        self.emit('visible', False)
+
+    def _window_state_cb(self, window, event):
+        """The window has been (de)iconified, so emit the proper signal.
+        """
+        if event.changed_mask & gtk.gdk.WINDOW_STATE_ICONIFIED:
+            iconified = event.new_window_state & gtk.gdk.WINDOW_STATE_ICONIFIED
+            self.emit('visible', not iconified)
+
+    def _clicked_cb(self, button):
+        """Emit begin/end event depeing on the button label.
+        """
+        for image in button.get_children():
+            if image == self.images['skip']:
+                self.skip()
+            else:
+                self.begin_toggle()
+
+    def buzz(self):
+        """Raise the window to catch the attention of the user.
+        """
+        self.window.window.show()
+
+    def begin_toggle(self):
+        """Change the image on the first button, and emit the right signal.
+
+        If the current image is the play button, then change it to the stop
+        button and emit the 'begin' signal.
+        """
+        button = self.buttons['begin']
+        image = button.get_children()[0]
+        button.remove(image)
+        if image == self.images['play']:
+            button.add(self.images['pause'])
+            self.emit('begin')
+        else:
+            button.add(self.images['play'])
+            self.emit('suspend')
+
+    def skip(self):
+        """Emit a `skip' signal.
+        """
+        self.emit('skip')
+
+    @property
+    def title(self):
+        return self.window.get_title()
+
+    def set_title(self, title):
+        """Set the title of the window.
+
+        Keywords:
+            title text-string for the title
+        """
+        self.window.set_title(title)
+
+    @property
+    def text(self):
+        return self.progressbar.get_text()
+
+    def set_text(self, name):
+        """Set the text displayed inside the progress bar.
+
+        Keywords:
+            name text-string to show.
+        """
+        self.progressbar.set_text("%s" % (name,))
+
+    @property
+    def fraction(self):
+        return self.progressbar.get_fraction()
+
+    def set_fraction(self, fraction):
+        """Set the elapsed fraction of the progress bar.
+
+        Keywords:
+            fraction number in range [0.0, 1.0]
+
+        Raise:
+            ValueError: fraction not in [ 0..1 ]
+        """
+        if fraction < 0 or fraction > 1:
+            raise ValueError()
+        self.progressbar.set_fraction(fraction)
+
+    @property
+    def label(self):
+        return self.entry.get_text()
+
+    def set_completer(self, completer):
+        """Suggest labels while the user types them.
+
+        Keywords:
+            completer Completer object providing the suggestions.
+        """
+        self.completer = completer
+        self.completion = gtk.EntryCompletion()
+        self.completion.set_model(gtk.ListStore(str))
+        self.completion.set_text_column(0)
+        # suggestions are already filtered and ranked by the completer.
+        self.completion.set_match_func(lambda completion, key, it: True)
+        self.entry.set_completion(self.completion)
+        self.entry.connect('changed', self._changed_cb)
+
+    def _changed_cb(self, entry):
+        """Refresh the suggestions, given the text of the entry.
+        """
+        model = self.completion.get_model()
+        model.clear()
+        text = entry.get_text().decode('utf-8')
+        if text:
+            for label in self.completer.complete(text):
+                if label != text:
+                    model.append([label.encode('utf-8')])
+
+    def set_label(self, text):
+        """Set the label for the next pomodoro.
+
+        Keywords:
+            text text-string label
+        """
+        self.entry.set_text(text)
+
+
+class Renderer(object):
+    """Push values to the widgets of the user interface, skipping redundant
+    updates.
+
+    The last values pushed to each widget are cached:  texts are pushed only
+    when they change, and fractions only when the width in pixels of the
+    filled part of the progress bar changes.  While the window is not
+    visible, updates are kept aside and pushed as soon as the window shows
+    up again.
+    """
+
+    def __init__(self, ui):
+        """Initializer.
+
+        Keywords:
+            ui UI object to update.
+        """
+        self.ui = ui
+        self.visible = True
+        self.pending = {}
+        self.shown = {}
+
+        ui.connect('visible', self._visible_cb)
+
+    def _visible_cb(self, ui, visible):
+        """Suspend updates while hidden, and resynchronize once visible.
+        """
+        self.visible = visible
+        if visible:
+            for name in list(self.pending):
+                self._flush(name)
+
+    def _key(self, name, value):
+        """Return what the user would actually see of the given value.
+        """
+        if name == 'fraction':
+            width = self.ui.progressbar.allocation.width
+            if width > 1:
+                return int(value * width)
+        return value
+
+    def _flush(self, name):
+        value = self.pending.pop(name)
+        key = self._key(name, value)
+        if name not in self.shown or self.shown[name] != key:
+            getattr(self.ui, 'set_' + name)(value)
+            self.shown[name] = key
+
+    def _set(self, name, value):
+        self.pending[name] = value
+        if self.visible:
+            self._flush(name)
+
+    def set_title(self, title):
+        """Set the title of the window.
+
+        The title is shown in the task bar too, hence it is always updated.
+
+        Keywords:
+            title text-string for the title
+        """
+        self.pending['title'] = title
+        self._flush('title')
+
+    def set_text(self, name):
+        """Set the text displayed inside the progress bar.
+
+        Keywords:
+            name text-string to show.
+        """
+        self._set('text', name)
+
+    def set_fraction(self, fraction):
+        """Set the elapsed fraction of the progress bar.
+
+        Keywords:
+            fraction number in range [0.0, 1.0]
+
+        Raise:
+            ValueError: fraction not in [ 0..1 ]
+        """
+        if fraction < 0 or fraction > 1:
+            raise ValueError()
+        self._set('fraction', fraction)
+
+
+def synthesize(notes, frequency, size, channels, volume=0.5):
+    """Synthesize a sequence of notes into PCM samples.
+
+    Keywords:
+        notes list of (frequency, seconds) tuples.
+        frequency sample rate, in Hz.
+        size bits per sample, negative for signed samples.
+        channels number of interleaved channels.
+        volume number in range [0.0, 1.0]
+
+    Return:
+        array.array object of interleaved samples.
+    """
+    typecode = {8: 'B', -8: 'b', 16: 'H', -16: 'h'}[size]
+    offset = 0 if size < 0 else 2 ** (abs(size) - 1)
+    amplitude = (2 ** (abs(size) - 1) - 1) * volume
+    lengths = [int(seconds * frequency) for (hz, seconds) in notes]
+    # allocate the whole buffer at once, then fill it in place.
+    samples = array.array(typecode, [offset]) * (sum(lengths) * channels)
+    pos = 0
+    for ((hz, seconds), length) in zip(notes, lengths):
+        step = 2 * math.pi * hz / frequency
+        # fade in and out in 5ms, to avoid clicks between notes.
+        fade = max(1, min(length // 2, frequency // 200))
+        for i in xrange(length):
+            envelope = min(1, i / fade, (length - i) / fade)
+            value = int(offset + amplitude * envelope * math.sin(step * i))
+            for c in xrange(channels):
+                samples[pos] = value
+                pos += 1
+    return samples
+
+
+class ToneBank(object):
+    """PCM buffers of the cues of the phases, synthesized once.
+    """
+
+    def __init__(self, params=MIXER, tones=TONES):
+        """Initializer.
+
+        Keywords:
+            params (frequency, size, channels) tuple of the mixer.
+            tones dictionary mapping phase names to notes.
+        """
+        self.params = params
+        self.buffers = dict((name, synthesize(notes, *params))
+                            for (name, notes) in tones.items())
+        self.default = synthesize(TONE, *params)
+
+    def buffer(self, name):
+        """Return the buffer of the cue of the given phase.
+        """
+        return self.buffers.get(name, self.default)
+
+
+class Player(object):
+    """Audio player.
+
+    The cues of the phases are synthesized when the player is created, and
+    handed to the mixer straight from their buffers:  no audio file is read
+    nor decoded.  The audio mixer is opened on demand, and closed again
+    after `idle' seconds without playing anything, so that no audio device
+    is held between phase changes.
+    """
+
+    def __init__(self, idle=IDLE):
+        """Initializer.
+
+        Keywords:
+            idle how many seconds to wait before closing the audio mixer.
+        """
+        self.idle = idle
+        self.bank = ToneBank()
+        self.sounds = {}
+        self.sound = None
+        self.channel = None
+        self.closing = None
+
+    @property
+    def started(self):
+        try:
+            return self.channel.get_busy() != 0
+        except AttributeError:
+            return False
+
+    def _open(self):
+        """Initialize the audio mixer.
+        """
+        if pygame.mixer.get_init() is None:
+            pygame.mixer.init(*self.bank.params)
+            params = pygame.mixer.get_init()
+            if params != self.bank.params:
+                # the device forced a different format.
+                self.bank = ToneBank(params)
+
+    def _sound(self, name):
+        """Return the sound object of the cue of the given phase.
+        """
+        sound = self.sounds.get(name)
+        if sound is None:
+            sound = self.sounds[name] = pygame.mixer.Sound(
+                buffer=self.bank.buffer(name))
+        return sound
+
+    def close(self):
+        """Release the audio mixer, keeping the synthesized cues around.
+        """
+        if self.closing is not None:
+            gobject.source_remove(self.closing)
+            self.closing = None
+        self.channel = None
+        self.sound = None
+        self.sounds = {}
+        if pygame.mixer.get_init() is not None:
+            pygame.mixer.quit()
+
+    def _idle_cb(self):
+        """Close the audio mixer, unless something is still playing.
+        """
+        if self.started:
+            return True
+        self.closing = None
+        self.close()
+        return False
+
+    def start(self, name=None):
+        """Start to play the cue of the given phase.
+
+        Keywords:
+            name name of the phase.
+
+        Raise:
+            AlreadyStarted
+        """
+        if self.started:
+            raise AlreadyStarted()
+        self._open()
+        self.sound = self._sound(name)
+        self.channel = self.sound.play()
+        if self.closing is not None:
+            gobject.source_remove(self.closing)
+        self.closing = gobject.timeout_add_seconds(self.idle, self._idle_cb)
+
+    def stop(self):
+        """Stop to play the cue.
+
+        Raise:
+            NotYetStarted
+        """
+        if not self.started:
+            raise NotYetStarted()
+        self.sound.stop()
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import os
+import sqlite3
+import threading
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+
+LOG = os.path.join(os.path.expanduser("~"), '.pomodoro_history')
+DB = LOG + '.db'
+HEAD = 64 # bytes of the log used to detect that it was replaced
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pomodoros (
+    timestamp TEXT NOT NULL,
+    label TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pomodoros_timestamp ON pomodoros (timestamp);
+CREATE INDEX IF NOT EXISTS pomodoros_label ON pomodoros (label, timestamp);
+
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, label)
+);
+CREATE INDEX IF NOT EXISTS daily_label ON daily (label, day);
+
+CREATE TRIGGER IF NOT EXISTS pomodoros_daily AFTER INSERT ON pomodoros
+BEGIN
+    INSERT OR IGNORE INTO daily
+        VALUES (substr(NEW.timestamp, 1, 10), NEW.label, 0);
+    UPDATE daily SET count = count + 1
+        WHERE day = substr(NEW.timestamp, 1, 10) AND label = NEW.label;
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+def parse(line):
+    """Parse a line of the history log.
+
+    Keywords:
+        line text-string formatted as "<date> | <label>\\n"
+
+    Return:
+        (datetime, label) tuple.
+
+    Raise:
+        ValueError: malformed line
+    """
+    (date, label) = line.rstrip('\n').split(' | ', 1)
+    try:
+        date = datetime.datetime.strptime(date, '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError:
+        # str(datetime) omits microseconds when they are 0.
+        date = datetime.datetime.strptime(date, '%Y-%m-%d %H:%M:%S')
+    return (date, label)
+
+
+class Writer(object):
+    """Append records to the history log from a background thread.
+
+    Records are queued and written by a worker thread, through a file handle
+    kept open:  a slow disk (e.g. a network mounted home) never stalls the
+    caller.  The worker writes whatever is queued in a single batch, then
+    flushes it and, when `fsync' is enabled, waits for it to hit the disk.
+
+    At most `size' records are kept in memory:  once the queue is full,
+    `append' blocks until the worker catches up.
+
+    A batch that cannot be written is dropped, and the history log is opened
+    again for the following ones:  the worker keeps draining the queue, and
+    the first error is raised by `close'.  The log is opened again as well
+    when it has been replaced (e.g. rotated by another process).
+    """
+
+    STOP = object()
+
+    def __init__(self, log=LOG, size=64, fsync=True):
+        """Initializer.
+
+        Keywords:
+            log location of the history log.
+            size maximum number of records waiting to be written.
+            fsync whether to sync each batch to disk.
+        """
+        self.log = log
+        self.f = open(log, 'ab')
+        self.fsync = fsync
+        self.error = None
+        self.lost = 0
+        self.queue = queue.Queue(size)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _put(self, item):
+        """Queue an item, unless the worker is gone.
+
+        Raise:
+            IOError: the worker thread is not running
+        """
+        while True:
+            if not self.thread.is_alive():
+                raise IOError("history writer stopped")
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def append(self, label, date=None):
+        """Queue a record for the history log.
+
+        Keywords:
+            label text-string label of the pomodoro.
+            date datetime object of the end of the pomodoro (default: now).
+
+        Raise:
+            IOError: the worker thread is not running
+        """
+        if date is None:
+            date = datetime.datetime.now()
+        self._put("%s | %s\n" % (date, label))
+
+    def close(self):
+        """Write all the queued records, and close the history log.
+
+        Raise:
+            IOError: some records could not be written
+        """
+        if self.thread.is_alive():
+            try:
+                self._put(self.STOP)
+            except IOError:
+                pass
+            self.thread.join()
+        if self.f is not None:
+            self.f.close()
+        if self.error is not None:
+            raise IOError("%d records lost: %s" % (self.lost, self.error))
+
+    def _write(self, batch):
+        try:
+            if self.f is not None and self._replaced():
+                self.f.close()
+                self.f = None
+            if self.f is None:
+                self.f = open(self.log, 'ab')
+            self.f.write(''.join(batch))
+            self.f.flush()
+            if self.fsync:
+                os.fsync(self.f.fileno())
+        except EnvironmentError as e:
+            if self.error is None:
+                self.error = e
+            self.lost += len(batch)
+            if self.f is not None:
+                try:
+                    self.f.close()
+                except EnvironmentError:
+                    pass
+                self.f = None
+
+    def _replaced(self):
+        """Return whether the open log is no longer the one at its path.
+        """
+        try:
+            st = os.stat(self.log)
+        except OSError:
+            return True
+        fst = os.fstat(self.f.fileno())
+        return (st.st_dev, st.st_ino) != (fst.st_dev, fst.st_ino)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self.STOP:
+                batch.pop()
+                stop = True
+            if batch:
+                self._write(batch)
+
+
+class History(object):
+    """Pomodoro history indexed by timestamp and label.
+
+    Each finished pomodoro is stored inside a SQLite database, together with
+    per day and per label counters maintained by a trigger:  aggregate
+    queries only read the counters, hence their cost does not depend on the
+    number of recorded pomodoros.
+
+    The store is meant to be used as a library:  the application keeps
+    appending to the history log, which `sync' imports on demand.
+    """
+
+    def __init__(self, path=DB):
+        """Initializer.
+
+        Keywords:
+            path location of the database file.
+        """
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database.
+        """
+        self.conn.close()
+
+    def add(self, date, label):
+        """Record a finished pomodoro.
+
+        Keywords:
+            date datetime object of the end of the pomodoro.
+            label text-string label of the pomodoro.
+        """
+        with self.conn:
+            self._insert([(date, label)])
+
+    def _insert(self, records):
+        self.conn.executemany("INSERT INTO pomodoros VALUES (?, ?)",
+                              ((str(date), label) for (date, label) in records))
+
+    def sync(self, log=LOG):
+        """Import the records appended to the history log since last sync.
+
+        The first invocation imports the whole log;  following ones only
+        parse the bytes appended in the meanwhile.  A log shorter than what
+        already imported, or whose first bytes changed, is considered a brand
+        new one (e.g. rotated), and the whole history is imported again,
+        sealed months included.
+
+        Keywords:
+            log location of the history log.
+
+        Return:
+            the number of imported pomodoros.
+        """
+        import archive # archive imports history
+        offset = self._meta('offset', 0)
+        old = self._meta('head', u'')
+        try:
+            f = open(log, 'rb')
+        except IOError:
+            return 0
+        with f:
+            head = f.read(HEAD).decode('utf-8', 'replace')
+            f.seek(0, os.SEEK_END)
+            if f.tell() < offset or head[:len(old)] != old:
+                offset = 0
+                old = u''
+            f.seek(offset)
+            data = f.read()
+        # leave partially written lines for the next sync.
+        data = data[:data.rfind(b'\n') + 1]
+        records = []
+        for line in archive.iterlines(log, data, sealed=offset == 0):
+            try:
+                records.append(parse(line.decode('utf-8')))
+            except ValueError: # UnicodeDecodeError included
+                continue
+        with self.conn:
+            if offset == 0:
+                self.conn.execute("DELETE FROM pomodoros")
+                self.conn.execute("DELETE FROM daily")
+            self._insert(records)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              ('offset', offset + len(data)))
+            if len(head) > len(old):
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                  ('head', head))
+        return len(records)
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?",
+                                (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _query(self, column, start, end, label):
+        """Sum daily counters grouped by the given column expression.
+        """
+        (where, args) = self._where(start, end, label)
+        return self.conn.execute(
+            "SELECT %s, SUM(count) FROM daily %s GROUP BY 1 ORDER BY 1"
+            % (column, where), args).fetchall()
+
+    def _where(self, start, end, label):
+        clauses = []
+        args = []
+        if start is not None:
+            clauses.append("day >= ?")
+            args.append(start.isoformat())
+        if end is not None:
+            clauses.append("day < ?")
+            args.append(end.isoformat())
+        if label is not None:
+            clauses.append("label = ?")
+            args.append(label)
+        if not clauses:
+            return ("", args)
+        return ("WHERE " + " AND ".join(clauses), args)
+
+    def count(self, start=None, end=None, label=None):
+        """Return the number of pomodoros recorded in the given period.
+
+        Keywords:
+            start date object of the first day (included) of the period.
+            end date object of the last day (excluded) of the period.
+            label only count pomodoros with the given label.
+        """
+        (where, args) = self._where(start, end, label)
+        return self.conn.execute("SELECT COALESCE(SUM(count), 0) FROM daily "
+                                 + where, args).fetchone()[0]
+
+    def per_day(self, start=None, end=None, label=None):
+        """Return a list of (day, count) tuples, sorted by day.
+
+        Days are formatted as "YYYY-MM-DD";  see `count' for the keywords.
+        """
+        return self._query("day", start, end, label)
+
+    def per_week(self, start=None, end=None, label=None):
+        """Return a list of (week, count) tuples, sorted by week.
+
+        Weeks are identified by their monday, formatted as "YYYY-MM-DD";  see
+        `count' for the keywords.
+        """
+        return self._query("date(day, 'weekday 0', '-6 days')", start, end,
+                           label)
+
+    def per_label(self, start=None, end=None, label=None):
+        """Return a list of (label, count) tuples, sorted by label.
+
+        See `count' for the keywords.
+        """
+        return self._query("label", start, end, label)
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+
+import gobject
+
+from core import TICKS, RESYNC
+from core import monotonic
+from core import AlreadyStarted, NotYetStarted
+
+
+class Adapter(gobject.GObject):
+    """Re-expose the signals of an Emitter object as GObject signals.
+
+    Handlers connected to the adapter receive the adapter in place of the
+    emitter;  attributes not found on the adapter are looked up on the
+    emitter, hence the adapter can stand in for it.
+    """
+
+    __gsignals__ = {
+        'fire': (gobject.SIGNAL_RUN_FIRST, None, ()),
+        'phase-fraction': (gobject.SIGNAL_RUN_FIRST, None,
+                           (gobject.TYPE_STRING, # name of the current fase
+                            gobject.TYPE_INT, # index of the current fase
+                            gobject.TYPE_INT, # number of elapsed ticks
+                            gobject.TYPE_INT, # number of total ticks
+                           ))
+    }
+
+    def __init__(self, emitter):
+        """Initializer.
+
+        Keywords:
+            emitter Emitter object (e.g. a Core or Timer object) to adapt.
+        """
+        super(Adapter, self).__init__()
+
+        self.emitter = emitter
+        for name in emitter.__signals__:
+            emitter.connect(name, self._forward, name)
+
+    def __getattr__(self, name):
+        return getattr(self.emitter, name)
+
+    def _forward(self, emitter, *args):
+        self.emit(args[-1], *args[:-1])
+
+class Clock(gobject.GObject):
+    """Tick generator object.
+
+    Emit a `tick' signal per second.
+    """
+
+    __gsignals__ = {
+        'tick': (gobject.SIGNAL_RUN_FIRST, None, ())
+    }
+
+    def __init__(self):
+        super(Clock, self).__init__()
+
+        self.started = None
+        self.expected = None
+        self.probe = None
+
+    def start(self):
+        """Start to emit ticks.
+
+        Raise:
+            AlreadyStarted
+        """
+        if self.started is not None:
+            raise AlreadyStarted()
+        self.expected = monotonic() + 1 / TICKS
+        self.started = gobject.timeout_add(1000 // TICKS, self._tick)
+
+    def stop(self):
+        """Stop to emit ticks.
+
+        Raise:
+            NotYetStarted.
+        """
+        if self.started is None:
+            raise NotYetStarted()
+        gobject.source_remove(self.started)
+        self.started = None
+
+    def _tick(self):
+        """Emit a `tick' signal.
+
+        When a probe is attached, record how late the tick is with respect
+        to the schedule.
+        """
+        if self.probe is not None:
+            self.probe.late('tick', self.expected)
+        self.expected += 1 / TICKS
+        self.emit('tick')
+
+        return True
+
+
+class DeadlineClock(gobject.GObject):
+    """Deadline driven tick generator object.
+
+    Instead of waking up once per tick, arm a single timeout expiring on the
+    next phase boundary of the given core object, and measure elapsed time
+    against a monotonic clock.  While the user interface is visible, an
+    additional timeout periodically refreshes the elapsed time so that the
+    countdown keeps moving.
+
+    Emit an `elapsed' signal carrying the number of ticks elapsed since the
+    previous emission;  a single emission never crosses a phase boundary.
+    Ticks missed because of delayed timeouts are caught up on the next
+    wakeup, hence the session never drifts from the measuring clock.
+
+    GLib timeouts do not account for the time the system is suspended:
+    when measuring elapsed time with a clock which does (e.g. `boottime'),
+    wake up at least every `RESYNC' seconds, so that phases ended during a
+    suspension are caught up shortly after the system resumes.  While
+    catching up, `lag' holds how long ago the ticks being emitted actually
+    elapsed.
+
+    When a probe is attached, record how late timeouts are with respect to
+    their schedule.
+    """
+
+    __gsignals__ = {
+        'elapsed': (gobject.SIGNAL_RUN_FIRST, None,
+                    (gobject.TYPE_INT, # number of elapsed ticks
+                    ))
+    }
+
+    def __init__(self, core, clock=monotonic):
+        """Initializer.
+
+        Keywords:
+            core Core object whose phase boundaries drive the timeouts.
+            clock function returning the current time, in seconds.
+        """
+        super(DeadlineClock, self).__init__()
+
+        self.core = core
+        self.clock = clock
+        self.lag = 0
+        self.started = None
+        self.refresh = None
+        self.visible = True
+        self.last = None
+        self.deadline = None
+        self.wakeup = None
+        self.expected = None
+        self.probe = None
+
+        core.connect('phase-fraction', self._phase_fraction_cb)
+
+    def start(self):
+        """Start to measure elapsed time.
+
+        Raise:
+            AlreadyStarted
+        """
+        if self.started is not None:
+            raise AlreadyStarted()
+        self.last = self.clock()
+        self._arm()
+        if self.visible:
+            self._arm_refresh()
+
+    def stop(self):
+        """Emit the ticks elapsed so far, and stop to measure time.
+
+        Raise:
+            NotYetStarted.
+        """
+        if self.started is None:
+            raise NotYetStarted()
+        self._account()
+        if self.started is not None:
+            gobject.source_remove(self.started)
+            self.started = None
+        self._disarm_refresh()
+
+    def set_visible(self, visible):
+        """Enable or disable the periodic refresh timeout.
+
+        Keywords:
+            visible whether the user interface is currently visible.
+        """
+        if visible == self.visible:
+            return
+        self.visible = visible
+        if self.started is None:
+            return
+        if visible:
+            # catch up with the time elapsed while hidden.
+            self._wake()
+            if self.started is not None:
+                self._arm_refresh()
+        else:
+            self._disarm_refresh()
+
+    def _account(self):
+        """Emit the ticks elapsed since the last emission.
+
+        Ticks are delivered in chunks never crossing a phase boundary, so
+        that handlers can stop the clock at the end of a phase.
+        """
+        now = self.clock()
+        ticks = int((now - self.last) * TICKS)
+        self.last += ticks / TICKS
+        while ticks > 0 and self.started is not None:
+            count = min(ticks, self.core.remaining())
+            ticks -= count
+            self.lag = now - (self.last - ticks / TICKS)
+            self.emit('elapsed', count)
+        self.lag = 0
+
+    def _arm(self):
+        """(Re)arm the timeout expiring on the next phase boundary.
+        """
+        if self.started is not None:
+            gobject.source_remove(self.started)
+        self.deadline = self.last + self.core.remaining() / TICKS
+        now = self.clock()
+        delay = self.deadline - now
+        if self.clock is not monotonic:
+            delay = min(delay, RESYNC)
+        # lateness is measured against the wakeup actually asked for, which
+        # may be a resync one, well before the deadline.
+        self.wakeup = now + max(0, delay)
+        self.started = gobject.timeout_add(max(0, int(delay * 1000) + 1),
+                                           self._boundary_cb)
+
+    def _arm_refresh(self):
+        if self.refresh is None:
+            self.expected = self.clock() + 1 / TICKS
+            self.refresh = gobject.timeout_add(1000 // TICKS, self._refresh_cb)
+
+    def _disarm_refresh(self):
+        if self.refresh is not None:
+            gobject.source_remove(self.refresh)
+            self.refresh = None
+
+    def _wake(self):
+        """Emit the elapsed ticks and rearm the boundary timeout.
+        """
+        self._account()
+        if self.started is not None:
+            self._arm()
+
+    def _boundary_cb(self):
+        if self.probe is not None:
+            self.probe.late('boundary', self.wakeup, self.clock)
+        self._wake()
+
+        return False
+
+    def _refresh_cb(self):
+        if self.probe is not None:
+            self.probe.late('refresh', self.expected, self.clock)
+        self.expected += 1 / TICKS
+        self._wake()
+
+        return self.started is not None
+
+    def _phase_fraction_cb(self, core, name, phase, count, ticks):
+        """A new phase may have been loaded (e.g. skip): rearm the timeout.
+        """
+        if count == 0 and self.started is not None:
+            self._arm()
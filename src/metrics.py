@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import os
+import socket
+import stat
+
+from core import TICKS
+from service import Service
+
+
+RESPONSE = ("HTTP/1.0 200 OK\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            "Content-Length: %d\r\n"
+            "Connection: close\r\n"
+            "\r\n")
+
+
+class Exporter(object):
+    """Keep a snapshot of the state of a core object, and render it in the
+    Prometheus text format.
+
+    The snapshot is only updated by `phase-fraction' signals:  rendering it
+    never touches the core object, nor the user interface.
+    """
+
+    def __init__(self, core, clk=None):
+        """Initializer.
+
+        Keywords:
+            core Core object to export.
+            clk DeadlineClock object driving the core object, used to keep
+                the remaining time accurate between two signals.
+        """
+        self.clk = clk
+        self.name = None
+        self.phase = 0
+        self.count = 0
+        self.ticks = 0
+        self.completed = {}
+
+        core.connect('phase-fraction', self._phase_fraction_cb)
+
+    def _phase_fraction_cb(self, core, name, phase, count, ticks):
+        self.name = name
+        self.phase = phase
+        self.count = count
+        self.ticks = ticks
+        if count == ticks:
+            self.completed[name] = self.completed.get(name, 0) + 1
+
+    @property
+    def running(self):
+        return self.clk is not None and self.clk.started is not None
+
+    def remaining(self):
+        """Return the number of seconds left before the current phase ends.
+        """
+        remaining = (self.ticks - self.count) / TICKS
+        if self.running:
+            # the snapshot refers to the last tick accounted by the clock.
+            remaining -= self.clk.clock() - self.clk.last
+        return max(0, remaining)
+
+    def render(self):
+        """Return the snapshot in the Prometheus text format.
+        """
+        lines = ["# HELP pomodoro_phase Name of the current phase.",
+                 "# TYPE pomodoro_phase gauge"]
+        if self.name is not None:
+            lines.append('pomodoro_phase{name="%s"} 1' % (self.name,))
+        lines.extend([
+            "# HELP pomodoro_phase_index Index of the current phase.",
+            "# TYPE pomodoro_phase_index gauge",
+            "pomodoro_phase_index %d" % (self.phase,),
+            "# HELP pomodoro_phase_seconds Duration of the current phase.",
+            "# TYPE pomodoro_phase_seconds gauge",
+            "pomodoro_phase_seconds %g" % (self.ticks / TICKS,),
+            "# HELP pomodoro_remaining_seconds Time left in the current phase.",
+            "# TYPE pomodoro_remaining_seconds gauge",
+            "pomodoro_remaining_seconds %g" % (self.remaining(),),
+            "# HELP pomodoro_running Whether the clock is running.",
+            "# TYPE pomodoro_running gauge",
+            "pomodoro_running %d" % (self.running,),
+            "# HELP pomodoro_completed_total Phases run until their end.",
+            "# TYPE pomodoro_completed_total counter"])
+        for name in sorted(self.completed):
+            lines.append('pomodoro_completed_total{name="%s"} %d'
+                         % (name, self.completed[name]))
+        return "\n".join(lines) + "\n"
+
+
+def parse(address):
+    """Parse the address of the endpoint.
+
+    Keywords:
+        address either a path (containing a `/') of a unix socket, or a
+            "[host:]port" string of a TCP socket (host defaults to localhost).
+
+    Return:
+        (family, address) tuple suitable for socket objects.
+
+    Raise:
+        ValueError: malformed address
+    """
+    if '/' in address:
+        return (socket.AF_UNIX, address)
+    (host, sep, port) = address.rpartition(':')
+    return (socket.AF_INET, (host or '127.0.0.1', int(port)))
+
+
+class Server(Service):
+    """Serve the snapshot of an exporter over HTTP, from the GLib main loop
+    (see `Service').
+    """
+
+    TERMINATOR = b'\r\n\r\n'
+
+    def __init__(self, exporter, address):
+        """Initializer.
+
+        Keywords:
+            exporter Exporter object to serve.
+            address see `parse';  a stale unix socket is replaced.
+
+        Raise:
+            ValueError: malformed address, or path of something other than
+                a socket
+        """
+        self.exporter = exporter
+        (family, self.address) = parse(address)
+        if family == socket.AF_UNIX and os.path.lexists(self.address):
+            if not stat.S_ISSOCK(os.lstat(self.address).st_mode):
+                raise ValueError("not a socket: %s" % (self.address,))
+            os.unlink(self.address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setblocking(False)
+        self.sock.bind(self.address)
+        self.sock.listen(16)
+        self.serve(self.sock)
+
+    def close(self):
+        """Stop serving, and close the listening socket.
+        """
+        self.unserve()
+        family = self.sock.family
+        self.sock.close()
+        if family == socket.AF_UNIX:
+            os.unlink(self.address)
+
+    def respond(self, request):
+        """Return the metrics:  the request itself is not inspected, every
+        path gets them.
+        """
+        body = self.exporter.render()
+        return (RESPONSE % (len(body),) + body).encode('ascii')
@@ -4,472 +4,80 @@
 from __future__ import division
 import datetime
 import os
+import signal
 import sys
+import time
 
-import gobject
-import gtk
+from core import TICKS, WORK, BREAK, COFFEE
+from core import monotonic, boottime
+from core import AlreadyStarted, NotYetStarted
+from core import Emitter
+from core import TimingWheel, Timer, Schedule, Core
+from core import DEFAULT
+from mainloop import Adapter, Clock, DeadlineClock
+import history
+from history import LOG
 
-try:
-    import pygame
-    assert pygame.__version__ >= '1.8'
-except (ImportError, AssertionError, AttributeError):
-    sys.stderr.write('PyGame 1.8 or more recent required\n')
-    sys.exit(1)
 
+SCHEDULE = os.path.join(os.path.expanduser("~"), '.pomodoro_schedule')
 
-TICKS = 1 # number of ticks per second
-WORK = 25 * 60 # in seconds
-BREAK = 5 * 60 # in seconds
-COFFEE = 10 * 60 # in seconds
 
-BEEP = sys.path[0] + '/beep.wav'
-LOG = os.path.join(os.path.expanduser("~"), '.pomodoro_history')
-
-
-class AlreadyStarted(Exception):
-    """Raised when users try to start startable objects more than once.
-    """
-    pass
-
-class NotYetStarted(Exception):
-    """Raised when users try to stop objects not yet started.
-    """
-    pass
-
-
-class Clock(gobject.GObject):
-    """Tick generator object.
-
-    Emit a `tick' signal per second.
-    """
-
-    __gsignals__ = {
-        'tick': (gobject.SIGNAL_RUN_FIRST, None, ())
-    }
-
-    def __init__(self):
-        super(Clock, self).__init__()
-
-        self.started = None
-
-    def start(self):
-        """Start to emit ticks.
-
-        Raise:
-            AlreadyStarted
-        """
-        if self.started is not None:
-            raise AlreadyStarted()
-        self.started = gobject.timeout_add(1000 // TICKS, self._tick)
-
-    def stop(self):
-        """Stop to emit ticks.
-
-        Raise:
-            NotYetStarted.
-        """
-        if self.started is None:
-            raise NotYetStarted()
-        gobject.source_remove(self.started)
-        self.started = None
-
-    def _tick(self):
-        """Emit a `tick' signal.
-        """
-        self.emit('tick')
-
-        return True
-
-
-class Timer(gobject.GObject):
-    """Count incoming ticks and emit a signals.
-    """
-
-    __gsignals__ = {
-        'fire': (gobject.SIGNAL_RUN_FIRST, None, ()),
-    }
-
-    def __init__(self, ticks):
-        """Initializer.
-
-        Keywords:
-            ticks how many ticks to wait before to emit the signal.
-
-        Raise:
-            ValueError: ticks <= 0
-        """
-        super(Timer, self).__init__()
-
-        if ticks <= 0:
-            raise ValueError()
-        self.ticks = ticks
-        self.count = 0
-
-    def tick(self):
-        """Increment the tick counter and emit a signal on overflow.
-        """
-        self.count += 1
-        if self.count == self.ticks:
-            self.emit('fire')
-            self.count = 0
-
-    def reset(self, ticks=None):
-        """Reset tick counter and, optionally, the tick threshold.
-
-        Keywords:
-            ticks how many ticks to wait before to emit a signal.
-
-        Raise:
-            ValueError: ticks <= 0
-        """
-        self.count = 0
-        if ticks is not None:
-            if ticks <= 0:
-                raise ValueError()
-            self.ticks = ticks
-
-
-class Core(gobject.GObject):
-    """Core object of the pomodoro tracker.
-
-    The object periodically emit signals to notify the status of the current
-    session:
-    - name of the current session [ 'work', 'break', 'coffee' ]
-    - how many pomodoros have you done since last long break?
-    - how many elapsed ticks since the beginning of the current session?
-    - how many ticks count the current session?
-    """
-
-    __gsignals__ = {
-        'phase-fraction': (gobject.SIGNAL_RUN_FIRST, None,
-                           (gobject.TYPE_STRING, # name of the current fase
-                            gobject.TYPE_INT, # index of the current fase [ 1..4 ]
-                            gobject.TYPE_INT, # number of elapsed ticks
-                            gobject.TYPE_INT, # number of total ticks
-                           ))
-    }
-
-    def __init__(self):
-        super(Core, self).__init__()
-
-        self.timers = {'work': Timer(WORK * TICKS),
-                       'break': Timer(BREAK * TICKS),
-                       'coffee': Timer(COFFEE * TICKS)}
-        self.current = None
-        self.phase = 0
-        self.next_timer = self._next_timer()
-
-        for timer in self.timers.values():
-            timer.connect('fire', self._fire_cb)
-
-    def _next_timer(self):
-        """Generator return the name of next timers to use.
-
-        Phase 1/4: work, break.
-        Phase 2/4: work, break.
-        Phase 3/4: work, break.
-        Phase 4/4: work, coffee.
-        """
-        while True:
-            for i in xrange(4):
-                yield 'work'
-                yield 'break' if i != 3 else 'coffee'
-
-    def _fire_cb(self, timer):
-        """Emit a signal to notify the beginning of a new phase.
-        """
-        self.current = next(self.next_timer)
-        if self.current == 'work':
-            self.phase += 1
-            if self.phase == 5:
-                self.phase = 1
-        timer = self.timers[self.current]
-        self.emit('phase-fraction', self.current, self.phase, timer.count,
-                  timer.ticks)
-
-    def start(self):
-        """Load a timer, and start to receive ticks.
-
-        Raise:
-            AlreadyStarted
-        """
-        if self.current is not None:
-            raise AlreadyStarted()
-        self.current = next(self.next_timer)
-        self.phase = 1
-        timer = self.timers[self.current]
-        self.emit('phase-fraction', self.current, self.phase, timer.count,
-                  timer.ticks)
-
-    def tick(self):
-        """Route the tick to the active timer.
-
-        When a timer reach its limit, then we have to select the next one.
-
-        Raise:
-            NotYetStarted
-        """
-        if self.current is None:
-            raise NotYetStarted()
-        timer = self.timers[self.current]
-        # emit the signal before to tick the timer in orde to prevent
-        # race conditions between signals.
-        self.emit('phase-fraction', self.current, self.phase,
-                  (timer.count + 1), timer.ticks)
-        timer.tick()
-
-    def stop(self):
-        """Reset the current timer and set self.current to None.
-
-        Raise:
-            NotYetStarted
-        """
-        if self.current is None:
-            raise NotYetStarted()
-        self.timers[self.current].reset()
-        self.current = None
-        self.phase = 0
-        self.next_timer = self._next_timer()
-
-    def skip(self):
-        """Skip the current pomodoro phase.
-
-        Raise:
-            NotYetStarted
-        """
-        if self.current is None:
-            raise NotYetStarted()
-        self.timers[self.current].reset()
-        self._fire_cb(self.timers[self.current])
-
-
-class UI(gobject.GObject):
-    """User interface.
-    """
-
-    __gsignals__ = {
-        'begin': (gobject.SIGNAL_RUN_FIRST, None, ()),
-        'suspend': (gobject.SIGNAL_RUN_FIRST, None, ()),
-        'skip': (gobject.SIGNAL_RUN_FIRST, None, ()),
-        'close': (gobject.SIGNAL_RUN_FIRST, None, ()),
-    }
-
-    def __init__(self):
-        super(UI, self).__init__()
-
-        self.window = gtk.Window()
-        self.window.connect('delete-event', self._delete_cb)
-
-        vbox = gtk.VBox(homogeneous=False)
-
-        hbox = gtk.HBox(homogeneous=False)
-
-        self.progressbar = gtk.ProgressBar()
-
-        play_img = gtk.Image()
-        play_img.set_from_stock(gtk.STOCK_MEDIA_PLAY,
-                                gtk.ICON_SIZE_LARGE_TOOLBAR)
-        pause_img = gtk.Image()
-        pause_img.set_from_stock(gtk.STOCK_MEDIA_PAUSE,
-                                 gtk.ICON_SIZE_LARGE_TOOLBAR)
-        skip_img = gtk.Image()
-        skip_img.set_from_stock(gtk.STOCK_MEDIA_NEXT,
-                                gtk.ICON_SIZE_LARGE_TOOLBAR)
-        self.images = {'play': play_img,
-                       'pause': pause_img,
-                       'skip': skip_img
-                      }
-        [widget.show() for widget in self.images.values()]
-
-        self.buttons = dict()
-        self.buttons['begin'] = gtk.Button()
-        self.buttons['begin'].add(self.images['play'])
-        self.buttons['begin'].connect('clicked', self._clicked_cb)
-        hbox.pack_start(self.buttons['begin'], False, False)
-
-        self.buttons['skip'] = gtk.Button()
-        self.buttons['skip'].add(self.images['skip'])
-        self.buttons['skip'].connect('clicked', self._clicked_cb)
-        hbox.pack_start(self.buttons['skip'], False, False)
-
-        vbox.pack_start(hbox, True, True)
-
-        self.entry = gtk.Entry()
-        vbox.pack_start(self.entry, False, False)
-
-        hbox.pack_start(self.progressbar)
-        self.window.add(vbox)
-        self.window.show_all()
-
-    def _delete_cb(self, window, event):
-        """The window has been closed, so emit the proper signal.
-        """
-        self.emit('close')
-
-    def _clicked_cb(self, button):
-        """Emit begin/end event depeing on the button label.
-        """
-        for image in button.get_children():
-            if image == self.images['skip']:
-                self.skip()
-            else:
-                self.begin_toggle()
-
-    def buzz(self):
-        """Raise the window to catch the attention of the user.
-        """
-        self.window.window.show()
-
-    def begin_toggle(self):
-        """Change the image on the first button, and emit the right signal.
-
-        If the current image is the play button, then change it to the stop
-        button and emit the 'begin' signal.
-        """
-        button = self.buttons['begin']
-        image = button.get_children()[0]
-        button.remove(image)
-        if image == self.images['play']:
-            button.add(self.images['pause'])
-            self.emit('begin')
-        else:
-            button.add(self.images['play'])
-            self.emit('suspend')
-
-    def skip(self):
-        """Emit a `skip' signal.
-        """
-        self.emit('skip')
-
-    @property
-    def title(self):
-        return self.window.get_title()
-
-    def set_title(self, title):
-        """Set the title of the window.
-
-        Keywords:
-            title text-string for the title
-        """
-        self.window.set_title(title)
-
-    @property
-    def text(self):
-        return self.progressbar.get_text()
-
-    def set_text(self, name):
-        """Set the text displayed inside the progress bar.
-
-        Keywords:
-            name text-string to show.
-        """
-        self.progressbar.set_text("%s" % (name,))
-
-    @property
-    def fraction(self):
-        return self.progressbar.get_fraction()
-
-    def set_fraction(self, fraction):
-        """Set the elapsed fraction of the progress bar.
-
-        Keywords:
-            fraction number in range [0.0, 1.0]
-
-        Raise:
-            ValueError: fraction not in [ 0..1 ]
-        """
-        if fraction < 0 or fraction > 1:
-            raise ValueError()
-        self.progressbar.set_fraction(fraction)
-
-    @property
-    def label(self):
-        return self.entry.get_text()
-
-    def set_label(self, text):
-        """Set the label for the next pomodoro.
-
-        Keywords:
-            text text-string label
-        """
-        self.entry.set_text(text)
-
-
-class Player(object):
-    """Audio player.
+def _tick_cb(clk, core):
+    """Notify the core object about the new tick event.
     """
-
-    def __init__(self):
-        pygame.mixer.init() # XXX successive initializations?
-        self.sound = pygame.mixer.Sound(BEEP)
-        self.channel = None
-
-    @property
-    def started(self):
-        try:
-            return self.channel.get_busy() != 0
-        except AttributeError:
-            return False
-
-    def start(self):
-        """Start to play the audio file.
-
-        Raise:
-            AlreadyStarted
-        """
-        if self.started:
-            raise AlreadyStarted()
-        self.channel = self.sound.play()
-
-    def stop(self):
-        """Stop to play the audio file.
-
-        Raise:
-            NotYetStarted
-        """
-        if not self.started:
-            raise NotYetStarted()
-        self.sound.stop()
+    core.tick()
 
 
+def _elapsed_cb(clk, ticks, core):
+    """Notify the core object about the elapsed ticks.
 
-def _tick_cb(clk, core):
-    """Notify the core object about the new tick event.
+    Elapsed ticks never go past the end of the current phase, hence the clock
+    can still be stopped by the handlers of the signals emitted at the end of
+    a phase.
     """
-    core.tick()
+    core.advance(ticks / TICKS)
 
 
-def _phase_fraction_cb(core, name, phase, count, ticks, ui, player):
+def _phase_fraction_cb(core, name, phase, count, ticks, ui, renderer, player,
+                       clk, writer, completer):
     """Update the ui object, given the status of the core object.
 
     Keywords:
         core Core object which generated the signal.
-        name name of the timer [ 'work', 'break', 'coffee' ]
-        phase index of the current phase [ 1..4 ]
+        name name of the timer;  the first name of the schedule starts
+            the phases, and is the one logged as a pomodoro.
+        phase index of the current phase [ 1..schedule.count ]
         count number of elapsed ticks
         ticks total number of ticks
         ui Ui object that we need to update
+        renderer Renderer object used to update the ui widgets.
         player Player object used to play sounds.
+        clk DeadlineClock object driving the core object.
+        writer Writer object appending records to the history log.
+        completer Completer object suggesting labels.
     """
     (mins, secs) = divmod((ticks - count) // TICKS, 60)
-    ui.set_text("%s %sm:%ss" % (name, mins, secs))
-    ui.set_fraction(count / ticks)
+    renderer.set_text("%s %sm:%ss" % (name, mins, secs))
+    renderer.set_fraction(count / ticks)
+    first = core.schedule.names[0]
     if count == 0:
-        try:
-            player.start()
-        except AlreadyStarted:
-            pass
-        if name == 'work':
-            ui.set_title("Pomodoro %d/4" % (phase,))
-        ui.buzz()
+        if name == first:
+            renderer.set_title("Pomodoro %d/%d" % (phase, core.schedule.count))
+        if not core.restoring:
+            try:
+                player.start(name)
+            except AlreadyStarted:
+                pass
+            ui.buzz()
     if count == ticks:
-        if name == 'work':
+        if name == first:
             # log the pomodoro on the file ...
-            with open(LOG, 'a+') as f:
-                date = datetime.datetime.now()
-                message = ui.label if ui.label else '#void'
-                f.write("%s | %s\n" % (date, message))
-            pass
+            # (when catching up, the pomodoro ended a while ago)
+            date = datetime.datetime.now() - datetime.timedelta(seconds=clk.lag)
+            writer.append(ui.label if ui.label else '#void', date)
+            # ... and suggest its label from now on.
+            completer.add(ui.label.decode('utf-8'),
+                          time.mktime(date.timetuple()))
         else:
             # and force the user to start a new pomodoro manually.
             ui.begin_toggle()
@@ -497,13 +105,24 @@ def _suspend_cb(ui, clk):
     clk.stop()
 
 
-def _close_cb(ui, clk, core, player):
+def _visible_cb(ui, visible, clk):
+    """Refresh the user interface only while the window is visible.
+    """
+    clk.set_visible(visible)
+
+
+def _close_cb(ui, clk, core, player, probe, snapshotter, writer, completer):
     """Stop the clock first, and the core object second.
+
+    Save the state of the core object, to be restored on next start, wait
+    for pending history records to be written, cache the suggested labels,
+    and dump the collected timings, if any.
     """
     try:
         clk.stop()
     except NotYetStarted:
         pass
+    snapshotter.save()
     try:
         core.stop()
     except NotYetStarted:
@@ -512,29 +131,152 @@ def _close_cb(ui, clk, core, player):
         player.stop()
     except NotYetStarted:
         pass
-
+    try:
+        writer.close()
+    except IOError as e:
+        sys.stderr.write("history log: %s\n" % (e,))
+    completer.update(LOG)
+    completer.save()
+    if probe is not None:
+        probe.dump()
+
+    import gtk
     gtk.main_quit()
 
 
+def _schedule(path=SCHEDULE):
+    """Load the schedule of the phases, falling back on the default one when
+    the file is missing or malformed.
+    """
+    try:
+        with open(path) as f:
+            return Schedule.parse(f.read())
+    except (IOError, ValueError):
+        return DEFAULT
+
+
+def _instrumented(probe, name, handler):
+    """Return the handler, wrapped by the probe (if any) to record its wall
+    time.
+    """
+    return handler if probe is None else probe.wrap(name, handler)
+
+
 def _main():
-    clk = Clock()
+    # claim the single instance socket before paying for the desktop stack:
+    # if another instance is running, it is brought up instead.
+    import remote
+    try:
+        listener = remote.Listener()
+    except AlreadyStarted:
+        return
 
-    core = Core()
+    # keep only the records of the current month inside the log
+    import archive
+    archive.rotate(LOG)
+
+    # the desktop frontend is the only one depending on gtk and pygame
+    try:
+        import gobject
+        import gtk
+        from gui import UI, Renderer, Player
+    except ImportError as e:
+        sys.stderr.write("%s\n" % (e,))
+        sys.exit(1)
+    from complete import Completer
+    import events
+    import snapshot
+
+    core = Core(_schedule())
+
+    # keep counting while the system is suspended
+    clk = DeadlineClock(core, boottime)
 
     ui = UI()
     ui.set_title('Pomodoro')
 
+    renderer = Renderer(ui)
+
     player = Player()
 
-    clk.connect('tick', _tick_cb, core)
-    core.connect('phase-fraction', _phase_fraction_cb, ui, player)
+    # history records are written by a background thread, hence let it run
+    # while the main loop is idle.
+    gobject.threads_init()
+    writer = history.Writer(LOG)
+
+    # suggest past labels, parsing only what was logged since last exit
+    completer = Completer()
+    completer.update(LOG)
+    ui.set_completer(completer)
+
+    # opt-in timing instrumentation, dumped on close or on SIGUSR1
+    probe = None
+    if os.environ.get('POMODORO_PROBE'):
+        from probe import Probe
+        probe = Probe()
+        clk.probe = probe
+        signal.signal(signal.SIGUSR1, lambda signum, frame: probe.dump())
+
+    # opt-in metrics endpoint, e.g. POMODORO_METRICS=9100
+    address = os.environ.get('POMODORO_METRICS')
+    if address:
+        from metrics import Exporter, Server
+        Server(Exporter(core, clk), address)
+
+    clk.connect('elapsed', _instrumented(probe, 'elapsed', _elapsed_cb), core)
+    core.connect('phase-fraction',
+                 _instrumented(probe, 'phase-fraction', _phase_fraction_cb),
+                 ui, renderer, player, clk, writer, completer)
     ui.connect('begin', _begin_cb, core, clk)
     ui.connect('skip', _skip_cb, core)
     ui.connect('suspend', _suspend_cb, clk)
-    ui.connect('close', _close_cb, clk, core, player)
+    ui.connect('visible', _visible_cb, clk)
+
+    # keep track of what the user did, for later replay
+    events.Recorder(ui)
+
+    # resume the session interrupted by the last exit (or crash)
+    snapshot.restore(core)
+    snapshotter = snapshot.Snapshotter(core)
+    ui.connect('close', _close_cb, clk, core, player, probe, snapshotter,
+               writer, completer)
+
+    # accept commands from other instances
+    listener.attach(ui)
     
     gtk.main()
 
+    listener.close()
+
 
 if __name__ == '__main__':
-    _main()
+    if sys.argv[1:2] == ['stats']:
+        import stats
+        stats.main(sys.argv[2:])
+    elif sys.argv[1:2] == ['report']:
+        import report
+        report.main(sys.argv[2:])
+    elif sys.argv[1:2] == ['export']:
+        import export
+        export.main(sys.argv[2:])
+    elif sys.argv[1:2] == ['compact']:
+        import archive
+        import remote
+        if sys.argv[2:] in ([], [LOG]) and remote.running():
+            # records still on their way would be lost with the old log.
+            sys.stderr.write("pomodoro is running, close it first\n")
+            sys.exit(1)
+        archive.main(sys.argv[2:])
+    elif sys.argv[1:2] == ['replay']:
+        import events
+        events.main(sys.argv[2:], schedule=_schedule())
+    elif sys.argv[1:2] and sys.argv[1] in ('skip', 'toggle', 'label'):
+        import remote
+        reply = remote.send(*sys.argv[1:3])
+        if reply is None:
+            sys.stderr.write("pomodoro is not running\n")
+        elif reply != 'ok':
+            sys.stderr.write("%s\n" % (reply,))
+        sys.exit(0 if reply == 'ok' else 1)
+    else:
+        _main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import sys
+
+from core import monotonic
+
+
+# upper bounds, in seconds, of the histogram buckets: 10us .. ~42s
+BOUNDS = [0.00001 * 2 ** i for i in range(23)]
+
+
+class Histogram(object):
+    """Fixed-size histogram of durations, with exponential buckets.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Record a duration, in seconds.
+
+        Negative values (e.g. early timeouts) fall in the first bucket.
+        """
+        self.counts[bisect.bisect_left(BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def dump(self, out):
+        if not self.count:
+            return
+        out.write("  count %d  mean %.6fs  min %.6fs  max %.6fs\n"
+                  % (self.count, self.total / self.count, self.min, self.max))
+        for (i, count) in enumerate(self.counts):
+            if count:
+                bound = ("<= %.5fs" % (BOUNDS[i],) if i < len(BOUNDS)
+                         else "> %.5fs" % (BOUNDS[-1],))
+                out.write("  %-14s %d\n" % (bound, count))
+
+
+class Probe(object):
+    """Collect timing histograms of the clock and of signal handlers.
+
+    - `late' records how late a timeout fired, with respect to its schedule
+    - `wrap' decorates signal handlers, recording their wall time
+    """
+
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name):
+        """Return the histogram with the given name, creating it if needed.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def late(self, name, scheduled, clock=monotonic):
+        """Record the delay between now and the scheduled time.
+
+        Keywords:
+            name name of the timeout.
+            scheduled time at which the timeout should have fired.
+            clock function returning the current time, in seconds.
+        """
+        self.histogram(name + ' lateness').add(clock() - scheduled)
+
+    def wrap(self, name, handler):
+        """Return a function invoking the handler and recording its wall time.
+        """
+        histogram = self.histogram(name)
+        def wrapper(*args):
+            start = monotonic()
+            try:
+                return handler(*args)
+            finally:
+                histogram.add(monotonic() - start)
+        return wrapper
+
+    def dump(self, out=sys.stderr):
+        """Print all the histograms.
+        """
+        for name in sorted(self.histograms):
+            out.write("%s:\n" % (name,))
+            self.histograms[name].dump(out)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import socket
+
+from core import AlreadyStarted
+from service import Service
+
+
+SOCKET = os.path.join(os.path.expanduser("~"), '.pomodoro_socket')
+
+# commands accepted by the running instance, and the UI methods they invoke.
+COMMANDS = {'show': 'buzz', 'skip': 'skip', 'toggle': 'begin_toggle',
+            'label': 'set_label'}
+
+
+def _connect(path, timeout):
+    """Connect to the socket of the running instance.
+
+    Return:
+        the connected socket object, or None if there is no running
+        instance.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except socket.error as e:
+        sock.close()
+        if e.args[0] in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+    return sock
+
+
+def running(path=SOCKET):
+    """Return whether an instance is running, without sending it anything.
+    """
+    sock = _connect(path, 1)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def send(command, arg=None, path=SOCKET, timeout=1):
+    """Send a command to the running instance.
+
+    Keywords:
+        command name of the command (see `COMMANDS').
+        arg text-string argument of the command, if any.
+        path location of the socket of the running instance.
+        timeout maximum number of seconds to wait for the reply.
+
+    Return:
+        the reply of the running instance ('ok' on success), or None if
+        there is no running instance.
+    """
+    line = command if arg is None else "%s %s" % (command, arg)
+    sock = _connect(path, timeout)
+    if sock is None:
+        return None
+    try:
+        sock.sendall(line.replace('\n', ' ') + '\n')
+        sock.shutdown(socket.SHUT_WR)
+        reply = b''
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            reply += data
+        return reply.rstrip('\n')
+    except socket.timeout:
+        return 'timed out'
+    finally:
+        sock.close()
+
+
+class Listener(Service):
+    """Receive the commands sent by other instances, and forward them to the
+    UI object (see `Service').
+
+    Binding the socket is what makes an instance the running one:  the
+    socket of a crashed instance is replaced, while a live one makes the
+    initializer fail.
+    """
+
+    def __init__(self, path=SOCKET):
+        """Initializer.
+
+        Keywords:
+            path location of the socket.
+
+        Raise:
+            AlreadyStarted: another instance is listening on the socket
+        """
+        self.path = path
+        self.ui = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.bind(path)
+        except socket.error as e:
+            if e.args[0] != errno.EADDRINUSE:
+                raise
+            other = _connect(path, 1)
+            if other is not None:
+                # bring it up, without waiting for the reply.
+                try:
+                    other.sendall('show\n')
+                finally:
+                    other.close()
+                self.sock.close()
+                raise AlreadyStarted()
+            os.unlink(path)
+            self.sock.bind(path)
+        self.sock.setblocking(False)
+        self.sock.listen(4)
+
+    def attach(self, ui):
+        """Forward the commands to the given UI object, from the GLib main
+        loop.
+        """
+        self.ui = ui
+        self.serve(self.sock)
+
+    def close(self):
+        """Stop listening, and remove the socket.
+        """
+        self.unserve()
+        self.sock.close()
+        os.unlink(self.path)
+
+    def dispatch(self, line):
+        """Execute a command line.
+
+        Return:
+            the reply for the sender.
+        """
+        (command, sep, arg) = line.partition(' ')
+        method = COMMANDS.get(command)
+        if method is None:
+            return 'unknown command: %s' % (command,)
+        if self.ui is None:
+            return 'not ready'
+        if command == 'label':
+            getattr(self.ui, method)(arg)
+        else:
+            getattr(self.ui, method)()
+        return 'ok'
+
+    def respond(self, request):
+        """Execute the command line, if complete, and reply.
+        """
+        if b'\n' not in request:
+            return None
+        return self.dispatch(request.split(b'\n', 1)[0]) + '\n'
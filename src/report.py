@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+
+import archive
+
+
+def user(path):
+    """Return the name of the user owning the given history log:  the name
+    of the home directory for `.pomodoro_history' files, the name of the file
+    otherwise.
+    """
+    name = os.path.basename(path)
+    if name.startswith('.pomodoro_history'):
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return name
+
+
+def aggregate(paths, start=None, end=None):
+    """Count the pomodoros of the given history logs.
+
+    Lines are counted by their raw (day, label) bytes first, and only the
+    distinct keys are decoded.  Malformed lines (undecodable ones included)
+    are silently skipped.
+
+    Keywords:
+        paths locations of the history logs.
+        start first day (included) of the period, as "YYYY-MM-DD".
+        end last day (excluded) of the period, as "YYYY-MM-DD".
+
+    Return:
+        dictionary mapping users to Counter objects of (day, label) tuples.
+    """
+    counts = {}
+    for path in paths:
+        raw = collections.defaultdict(int)
+        for line in archive.iterlines(path):
+            (date, sep, label) = line.partition(b' | ')
+            if sep and len(date) >= 13:
+                raw[date[:10], label] += 1
+        counter = counts.setdefault(user(path), collections.Counter())
+        for ((day, label), count) in raw.iteritems():
+            try:
+                (day, label) = (day.decode('ascii'), label.decode('utf-8'))
+            except UnicodeDecodeError:
+                continue
+            if (start is None or day >= start) and (end is None or day < end):
+                counter[day, label] += count
+    return counts
+
+
+def _aggregate(args):
+    return aggregate(*args)
+
+
+def merge(partials):
+    """Merge the results of `aggregate'.
+    """
+    counts = {}
+    for partial in partials:
+        for (name, counter) in partial.items():
+            counts.setdefault(name, collections.Counter()).update(counter)
+    return counts
+
+
+def run(paths, processes=None, start=None, end=None):
+    """Aggregate the given history logs in parallel.
+
+    The logs are split into shards, about four per process, each one
+    aggregated by a worker process:  only the per user counts travel back.
+
+    Keywords:
+        processes number of worker processes (default: number of cpus);  1
+            aggregates the logs in the current process.
+
+    Return:
+        see `aggregate'.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1 or len(paths) < 2:
+        return aggregate(paths, start, end)
+    shards = [(paths[i::processes * 4], start, end)
+              for i in xrange(min(len(paths), processes * 4))]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return merge(pool.imap_unordered(_aggregate, shards))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _dump(out, title, groups):
+    """Print a total, followed by the counts of each group of keys.
+    """
+    total = sum(groups[0][1].values()) if groups else 0
+    out.write((u"%s: %d\n" % (title, total)).encode('utf-8'))
+    for (name, counter) in groups:
+        for (key, count) in sorted(counter.items()):
+            out.write((u"  %s %s %d\n" % (name, key, count)).encode('utf-8'))
+
+
+def main(argv, out=sys.stdout):
+    """Print per user, per day and per label counts of many history logs,
+    followed by the per label counts of the whole team.
+    """
+    parser = argparse.ArgumentParser(
+        prog='report', description='Summarize the history logs of a team.')
+    parser.add_argument('logs', nargs='+', help='history logs')
+    parser.add_argument('-j', '--processes', type=int,
+                        help='worker processes (default: number of cpus)')
+    parser.add_argument('-s', '--start', help='first day, YYYY-MM-DD')
+    parser.add_argument('-e', '--end', help='last day (excluded), YYYY-MM-DD')
+    args = parser.parse_args(argv)
+
+    counts = run(args.logs, args.processes, args.start, args.end)
+    team = collections.Counter()
+    for name in sorted(counts):
+        days = collections.Counter()
+        labels = collections.Counter()
+        for ((day, label), count) in counts[name].items():
+            days[day] += count
+            labels[label] += count
+        team.update(labels)
+        _dump(out, name, [('day', days), ('label', labels)])
+    _dump(out, 'team', [('label', team)])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import socket
+
+import gobject
+
+
+# errors of non-blocking sockets meaning "try again later"
+AGAIN = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+class Service(object):
+    """Serve the connections of a listening socket, from the GLib main loop.
+
+    Sockets are non-blocking and only served when ready, hence a slow or
+    stuck client never delays the main loop.  Each connection sends a
+    request, ended by `TERMINATOR' (or by closing its side), which is passed
+    to `respond';  the reply is then written back, and the connection
+    closed.
+    """
+
+    TERMINATOR = b'\n'
+    LIMIT = 8192 # maximum size, in bytes, of a request
+
+    watch = None
+
+    def serve(self, sock):
+        """Start to accept the connections of the given listening socket.
+        """
+        self.watch = gobject.io_add_watch(sock, gobject.IO_IN,
+                                          self._accept_cb)
+
+    def unserve(self):
+        """Stop accepting connections.
+        """
+        if self.watch is not None:
+            gobject.source_remove(self.watch)
+            self.watch = None
+
+    def respond(self, request):
+        """Return the reply to the given request, None to close the
+        connection without replying.
+        """
+        raise NotImplementedError()
+
+    def _accept_cb(self, sock, condition):
+        try:
+            (conn, address) = sock.accept()
+        except socket.error as e:
+            if e.args[0] in AGAIN:
+                return True
+            raise
+        conn.setblocking(False)
+        gobject.io_add_watch(conn, gobject.IO_IN | gobject.IO_HUP
+                             | gobject.IO_ERR, self._read_cb, [b''])
+        return True
+
+    def _read_cb(self, conn, condition, request):
+        """Read the request, then queue the reply.
+        """
+        try:
+            data = conn.recv(4096)
+        except socket.error as e:
+            if e.args[0] in AGAIN:
+                return True
+            conn.close()
+            return False
+        request[0] += data
+        if data and self.TERMINATOR not in request[0]:
+            if len(request[0]) > self.LIMIT:
+                conn.close()
+                return False
+            return True
+        reply = self.respond(request[0])
+        if reply is None:
+            conn.close()
+            return False
+        gobject.io_add_watch(conn, gobject.IO_OUT | gobject.IO_HUP
+                             | gobject.IO_ERR, self._write_cb, [reply])
+        return False
+
+    def _write_cb(self, conn, condition, reply):
+        if condition & (gobject.IO_HUP | gobject.IO_ERR):
+            conn.close()
+            return False
+        try:
+            sent = conn.send(reply[0])
+        except socket.error as e:
+            if e.args[0] in AGAIN:
+                return True
+            conn.close()
+            return False
+        reply[0] = reply[0][sent:]
+        if reply[0]:
+            return True
+        conn.close()
+        return False
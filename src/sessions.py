@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import heapq
+
+import gobject
+
+from core import TICKS
+from core import monotonic
+from core import AlreadyStarted, NotYetStarted
+from core import DEFAULT
+
+
+class Session(object):
+    """Lightweight state of a single pomodoro session.
+
+    - position of the current phase inside the schedule
+    - deadline of the current phase, None while suspended
+    - seconds left before the end of the current phase, while suspended
+    """
+
+    __slots__ = ('index', 'deadline', 'left')
+
+    def __init__(self, left):
+        self.index = 0
+        self.deadline = None
+        self.left = left
+
+
+class SessionManager(gobject.GObject):
+    """Host the pomodoro sessions of many users inside a single process.
+
+    The deadlines of the running sessions are kept inside a single heap:
+    the manager only wakes up when the earliest of them expires, regardless
+    of the number of sessions.  Stale heap entries (of suspended, skipped or
+    stopped sessions) are dropped lazily.
+
+    Like the desktop application, at the end of a break the next pomodoro is
+    loaded but suspended:  users have to start it manually.
+
+    Emit a `phase' signal every time a session moves to the next phase.
+    """
+
+    __gsignals__ = {
+        'phase': (gobject.SIGNAL_RUN_FIRST, None,
+                  (gobject.TYPE_PYOBJECT, # id of the session
+                   gobject.TYPE_STRING, # name of the new phase
+                   gobject.TYPE_INT, # index of the new phase [ 1..4 ]
+                  ))
+    }
+
+    def __init__(self, clock=monotonic, schedule=DEFAULT):
+        """Initializer.
+
+        Keywords:
+            clock function returning the current time, in seconds.
+            schedule Schedule object shared by all the sessions.
+        """
+        super(SessionManager, self).__init__()
+
+        self.clock = clock
+        self.schedule = schedule
+        self.sessions = {}
+        self.heap = []
+        self.timeout = None
+        self.attached = False
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, sid):
+        return sid in self.sessions
+
+    def _push(self, sid, session):
+        heapq.heappush(self.heap, (session.deadline, sid))
+        # drop stale entries once they outnumber valid ones.
+        if len(self.heap) > 2 * len(self.sessions) + 64:
+            self.heap = [(s.deadline, i) for (i, s) in self.sessions.items()
+                         if s.deadline is not None]
+            heapq.heapify(self.heap)
+
+    def _valid(self, entry):
+        (deadline, sid) = entry
+        session = self.sessions.get(sid)
+        return session is not None and session.deadline == deadline
+
+    def start(self, sid):
+        """Start (or resume) the session with the given id.
+
+        Unknown sessions are created on the fly.
+
+        Raise:
+            AlreadyStarted
+        """
+        session = self.sessions.get(sid)
+        if session is None:
+            session = self.sessions[sid] = Session(self._duration(0))
+        elif session.deadline is not None:
+            raise AlreadyStarted()
+        session.deadline = self.clock() + session.left
+        self._push(sid, session)
+        self._rearm()
+
+    def suspend(self, sid):
+        """Suspend the session with the given id.
+
+        Raise:
+            KeyError: unknown session
+            NotYetStarted
+        """
+        session = self.sessions[sid]
+        if session.deadline is None:
+            raise NotYetStarted()
+        session.left = max(0, session.deadline - self.clock())
+        session.deadline = None
+
+    def skip(self, sid):
+        """Skip the current phase of the session with the given id.
+
+        Raise:
+            KeyError: unknown session
+        """
+        self._next(sid, self.sessions[sid], self.clock(), False)
+        self._rearm()
+
+    def stop(self, sid):
+        """Forget the session with the given id.
+
+        Raise:
+            KeyError: unknown session
+        """
+        del self.sessions[sid]
+
+    def query(self, sid):
+        """Return the status of the session with the given id.
+
+        Return:
+            (name, phase, elapsed, total, running) tuple, where `elapsed' and
+            `total' are expressed in seconds.
+
+        Raise:
+            KeyError: unknown session
+        """
+        session = self.sessions[sid]
+        name = self.schedule.names[session.index]
+        total = self._duration(session.index)
+        if session.deadline is None:
+            left = session.left
+        else:
+            left = max(0, session.deadline - self.clock())
+        return (name, self.schedule.phases[session.index], total - left, total,
+                session.deadline is not None)
+
+    def _duration(self, index):
+        return self.schedule.durations[index] / TICKS
+
+    def _next(self, sid, session, now, expired):
+        """Load the next phase of the given session.
+
+        Keywords:
+            now beginning of the new phase.
+            expired whether the old phase ended naturally.
+        """
+        running = session.deadline is not None
+        session.index = (session.index + 1) % len(self.schedule)
+        name = self.schedule.names[session.index]
+        session.left = self._duration(session.index)
+        if running and not (expired and name == self.schedule.names[0]):
+            session.deadline = now + session.left
+            self._push(sid, session)
+        else:
+            session.deadline = None
+        self.emit('phase', sid, name, self.schedule.phases[session.index])
+
+    def next_deadline(self):
+        """Return the earliest deadline of the running sessions, or None.
+        """
+        heap = self.heap
+        while heap and not self._valid(heap[0]):
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def poll(self, now=None):
+        """Move to the next phase all the sessions whose deadline expired.
+
+        Keywords:
+            now current time, in seconds (default: clock()).
+
+        Return:
+            the earliest deadline still pending, or None.
+        """
+        if now is None:
+            now = self.clock()
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if self._valid(entry):
+                (deadline, sid) = entry
+                self._next(sid, self.sessions[sid], deadline, True)
+        return self.next_deadline()
+
+    def attach(self):
+        """Drive the sessions from the GLib main loop, with a single timeout.
+        """
+        self.attached = True
+        self._rearm()
+
+    def detach(self):
+        """Stop driving the sessions from the GLib main loop.
+        """
+        self.attached = False
+        if self.timeout is not None:
+            gobject.source_remove(self.timeout)
+            self.timeout = None
+
+    def _rearm(self):
+        """(Re)arm the timeout expiring on the earliest deadline.
+        """
+        if not self.attached:
+            return
+        if self.timeout is not None:
+            gobject.source_remove(self.timeout)
+            self.timeout = None
+        deadline = self.next_deadline()
+        if deadline is not None:
+            delay = max(0, deadline - self.clock())
+            self.timeout = gobject.timeout_add(int(delay * 1000) + 1,
+                                               self._timeout_cb)
+
+    def _timeout_cb(self):
+        self.poll()
+        self._rearm()
+
+        return False
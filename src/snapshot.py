@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+import time
+
+from core import monotonic
+
+
+SNAPSHOT = os.path.join(os.path.expanduser("~"), '.pomodoro_state')
+INTERVAL = 60 # maximum number of seconds between snapshots
+
+# magic, version, cycle index (-1 when stopped), phase, count, saved at
+LAYOUT = struct.Struct('<4sB3xiIId')
+MAGIC = b'POMO'
+VERSION = 2
+
+
+def dump(core):
+    """Return the binary snapshot of the state of the given core object.
+    """
+    (index, phase, count) = core.state
+    return LAYOUT.pack(MAGIC, VERSION, -1 if index is None else index, phase,
+                       count, time.time())
+
+
+def save(core, path=SNAPSHOT):
+    """Atomically write the snapshot of the given core object.
+
+    The snapshot is written on a temporary file first, which is then renamed
+    over the previous one:  a crash leaves either of them, never a mix.
+    """
+    tmp = path + '.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.write(fd, dump(core))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+
+
+def load(path=SNAPSHOT):
+    """Read a snapshot.
+
+    Return:
+        (index, phase, count, saved) tuple, where `saved' is the time at
+        which the snapshot was taken;  None if the snapshot is missing or
+        invalid.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        if os.fstat(fd).st_size != LAYOUT.size:
+            return None
+        buf = mmap.mmap(fd, LAYOUT.size, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, index, phase, count,
+             saved) = LAYOUT.unpack_from(buf)
+        finally:
+            buf.close()
+    finally:
+        os.close(fd)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return (None if index == -1 else index, phase, count, saved)
+
+
+def restore(core, path=SNAPSHOT):
+    """Restore the state of the given core object from a snapshot.
+
+    Return:
+        True if the state has been restored, False otherwise.
+    """
+    state = load(path)
+    if state is None:
+        return False
+    try:
+        core.set_state(*state[:3])
+    except ValueError:
+        return False
+    return True
+
+
+class Snapshotter(object):
+    """Periodically save snapshots of a core object.
+
+    A snapshot is taken at the beginning of every phase, and at least every
+    `interval' seconds otherwise.
+    """
+
+    def __init__(self, core, path=SNAPSHOT, interval=INTERVAL,
+                 clock=monotonic):
+        """Initializer.
+
+        Keywords:
+            core Core object to save.
+            path location of the snapshot.
+            interval maximum number of seconds between snapshots.
+            clock function returning the current time, in seconds.
+        """
+        self.core = core
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self.last = None
+
+        core.connect('phase-fraction', self._phase_fraction_cb)
+
+    def save(self):
+        """Save a snapshot right now.
+        """
+        save(self.core, self.path)
+        self.last = self.clock()
+
+    def _phase_fraction_cb(self, core, name, phase, count, ticks):
+        if (count == 0 or self.last is None
+                or self.clock() - self.last >= self.interval):
+            self.save()
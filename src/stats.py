@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import json
+import mmap
+import os
+import sys
+
+import archive
+from history import LOG
+
+
+class Stats(object):
+    """Aggregate counts of the pomodoros recorded inside the history log.
+
+    Counters are saved together with the offset of the first byte not yet
+    parsed, so that following updates only parse what appended meanwhile.
+    """
+
+    def __init__(self, checkpoint=None):
+        """Initializer.
+
+        Keywords:
+            checkpoint location of the file used to save aggregates.
+        """
+        self.checkpoint = checkpoint
+        self.offset = 0
+        self.days = collections.Counter()
+        self.labels = collections.Counter()
+        self.hours = collections.Counter()
+        if checkpoint is not None:
+            self.load()
+
+    def reset(self):
+        """Forget all the aggregates.
+        """
+        self.offset = 0
+        self.days.clear()
+        self.labels.clear()
+        self.hours.clear()
+
+    def load(self):
+        """Restore aggregates from the checkpoint file, if any.
+        """
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return
+        self.offset = state['offset']
+        self.days.update(state['days'])
+        self.labels.update(state['labels'])
+        self.hours.update(state['hours'])
+
+    def save(self):
+        """Atomically write aggregates on the checkpoint file.
+        """
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'offset': self.offset,
+                       'days': self.days,
+                       'labels': self.labels,
+                       'hours': self.hours}, f)
+        os.rename(tmp, self.checkpoint)
+
+    def update(self, log=LOG):
+        """Parse the records appended to the history log since last update.
+
+        A log shorter than the saved offset is considered a brand new one.
+
+        Keywords:
+            log location of the history log.
+
+        Return:
+            the number of parsed records.
+        """
+        try:
+            f = open(log, 'rb')
+        except IOError:
+            return 0
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset:
+                self.reset()
+            if size == self.offset:
+                return 0
+            buf = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                count = 0
+                for (day, hour, label) in archive.records(
+                        archive.split(buf, self.offset)):
+                    self.days[day] += 1
+                    self.hours[hour] += 1
+                    self.labels[label] += 1
+                    count += 1
+                # leave partially written lines for the next update.
+                self.offset = max(self.offset, buf.rfind(b'\n') + 1)
+            finally:
+                buf.close()
+        if self.checkpoint is not None:
+            self.save()
+        return count
+
+
+def _dump(out, title, counter):
+    out.write("%s:\n" % (title,))
+    for (key, count) in sorted(counter.items()):
+        out.write((u"  %s %d\n" % (key, count)).encode('utf-8'))
+
+
+def main(argv, out=sys.stdout):
+    """Print per day, per label and per hour counts of the history log,
+    sealed months included.
+
+    Usage: stats [LOG]
+    """
+    log = argv[0] if argv else LOG
+    stats = Stats(log + '.stats')
+    stats.update(log)
+    sealed = archive.counts(log)
+    _dump(out, 'per day', stats.days + sealed['days'])
+    _dump(out, 'per label', stats.labels + sealed['labels'])
+    _dump(out, 'per hour', stats.hours + sealed['hours'])
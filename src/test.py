@@ -1,9 +1,34 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import datetime
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import time
 import unittest
 
+import aio
+import archive
+import complete
+import events
+import export
+try:
+    import gui
+except ImportError:
+    gui = None
+import history
+import mainloop
+import metrics
 import pomodoro
+import probe
+import remote
+import report
+import sessions
+import snapshot
+import stats
 
 
 
@@ -32,6 +57,230 @@ class TestClockFunctions(unittest.TestCase):
         self.assertRaises(pomodoro.NotYetStarted, clk.stop)
 
 
+class TestDeadlineClockFunctions(unittest.TestCase):
+
+    def test_init(self):
+        clk = pomodoro.DeadlineClock(pomodoro.Core())
+
+        self.assertTrue(clk.started is None)
+        self.assertTrue(clk.refresh is None)
+
+    def test_start(self):
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c)
+
+        c.start()
+        clk.start()
+        self.assertTrue(clk.started != None)
+        self.assertTrue(clk.refresh != None)
+
+        self.assertRaises(pomodoro.AlreadyStarted, clk.start)
+
+    def test_stop(self):
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c)
+
+        c.start()
+        clk.start()
+        clk.stop()
+        self.assertTrue(clk.started is None)
+        self.assertTrue(clk.refresh is None)
+
+        self.assertRaises(pomodoro.NotYetStarted, clk.stop)
+
+    def test_set_visible(self):
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c)
+
+        c.start()
+        clk.start()
+        clk.set_visible(False)
+        self.assertTrue(clk.started != None)
+        self.assertTrue(clk.refresh is None)
+        clk.set_visible(True)
+        self.assertTrue(clk.refresh != None)
+
+    def test_catch_up(self):
+        now = [0]
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c, lambda: now[0])
+        ends = []
+        c.connect('phase-fraction',
+                  lambda core, name, phase, count, ticks:
+                  ends.append((name, clk.lag)) if count == ticks else None)
+        clk.connect('elapsed', pomodoro._elapsed_cb, c)
+
+        c.start()
+        clk.start()
+        # e.g. the system has been suspended for 50 minutes
+        now[0] = 50 * 60 + 0.5
+        clk._boundary_cb()
+        self.assertEqual(ends, [('work', 50 * 60 + 0.5 - pomodoro.WORK),
+                                ('break', 50 * 60 + 0.5 - pomodoro.WORK
+                                                        - pomodoro.BREAK)])
+        self.assertEqual(c.current, 'work')
+        self.assertEqual(c.phase, 2)
+        self.assertEqual(c.timers[c.current].count,
+                         50 * 60 - pomodoro.WORK - pomodoro.BREAK)
+        self.assertEqual(clk.lag, 0)
+
+    def test_boottime(self):
+        t = pomodoro.boottime()
+
+        self.assertTrue(pomodoro.boottime() >= t)
+
+
+class FakeLoop(object):
+    """Bare event loop, providing only what AsyncClock needs."""
+
+    class Handle(object):
+
+        def __init__(self, when, callback):
+            self.when = when
+            self.callback = callback
+            self.cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    def __init__(self):
+        self.now = 0
+        self.handles = []
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        handle = self.Handle(when, callback)
+        self.handles.append(handle)
+        return handle
+
+    def run(self, now):
+        """Move the time forward, running the expired callbacks."""
+        while True:
+            handles = sorted((h for h in self.handles if not h.cancelled
+                              and h.when <= now), key=lambda h: h.when)
+            if not handles:
+                break
+            self.handles.remove(handles[0])
+            self.now = handles[0].when
+            handles[0].callback()
+        self.now = now
+
+
+class TestAsyncClockFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+
+    def test_start(self):
+        c = pomodoro.Core()
+        clk = aio.AsyncClock(c, self.loop)
+
+        c.start()
+        clk.start()
+        self.assertTrue(clk.started != None)
+        self.assertEqual(clk.started.when, pomodoro.WORK)
+
+        self.assertRaises(pomodoro.AlreadyStarted, clk.start)
+
+    def test_stop(self):
+        c = pomodoro.Core()
+        clk = aio.AsyncClock(c, self.loop)
+
+        c.start()
+        clk.start()
+        self.loop.run(10)
+        clk.stop()
+        self.assertTrue(clk.started is None)
+        self.assertEqual(c.state, (0, 1, 10 * pomodoro.TICKS))
+
+        self.assertRaises(pomodoro.NotYetStarted, clk.stop)
+
+    def test_wake(self):
+        c = pomodoro.Core()
+        clk = aio.AsyncClock(c, self.loop, interval=60)
+        phases = []
+        c.connect('phase-fraction',
+                  lambda core, name, phase, count, ticks:
+                      phases.append(name) if not count else None)
+
+        c.start()
+        clk.start()
+        self.loop.run(pomodoro.WORK + pomodoro.BREAK + 90)
+        self.assertEqual(phases, ['work', 'break', 'work'])
+        # refreshed every minute.
+        self.assertEqual(c.state, (2, 2, 60 * pomodoro.TICKS))
+        self.assertEqual(clk.started.when,
+                         pomodoro.WORK + pomodoro.BREAK + 120)
+
+    def test_stop_at_boundary(self):
+        c = pomodoro.Core()
+        clk = aio.AsyncClock(c, self.loop)
+        # e.g. suspend at the end of every break.
+        c.connect('phase-fraction',
+                  lambda core, name, phase, count, ticks:
+                      clk.stop() if name == 'break' and count == ticks
+                      else None)
+
+        c.start()
+        clk.start()
+        # the callback is three hours late.
+        self.loop.now = 3 * 60 * 60
+        clk._wake()
+        self.assertTrue(clk.started is None)
+        self.assertEqual(c.state, (2, 2, 0))
+
+    @unittest.skipIf(aio.asyncio is None, 'asyncio not available')
+    def test_next_phase(self):
+        loop = aio.asyncio.new_event_loop()
+        try:
+            c = pomodoro.Core()
+            clk = aio.AsyncClock(c, loop)
+
+            c.start()
+            clk.start()
+            future = clk.next_phase()
+            loop.call_soon(c.skip)
+            self.assertEqual(loop.run_until_complete(future), ('break', 1))
+        finally:
+            loop.close()
+
+
+class TestTimingWheelFunctions(unittest.TestCase):
+
+    def test_tick(self):
+        w = pomodoro.TimingWheel(levels=2)
+        timers = [pomodoro.Timer(ticks, w)
+                  for ticks in (1, 63, 64, 65, 4095, 4096, 5000, 10000)]
+        fired = []
+        for t in timers:
+            t.connect('fire', lambda t: fired.append((w.now, t.ticks)))
+            t.arm()
+
+        [w.tick() for i in xrange(10000)]
+        for t in timers:
+            self.assertEqual([now for (now, ticks) in fired if ticks == t.ticks],
+                             range(t.ticks, 10001, t.ticks))
+
+    def test_cancel(self):
+        w = pomodoro.TimingWheel()
+        t = pomodoro.Timer(100, w)
+        fired = []
+        t.connect('fire', lambda t: fired.append(w.now))
+
+        t.arm()
+        [w.tick() for i in xrange(50)]
+        t.disarm()
+        self.assertEqual(t.count, 50)
+        [w.tick() for i in xrange(100)]
+        self.assertEqual(fired, [])
+        self.assertEqual(t.count, 50)
+        t.arm()
+        [w.tick() for i in xrange(50)]
+        self.assertEqual(fired, [200])
+
+
 class TestTimerFunctions(unittest.TestCase):
 
     def test_init(self):
@@ -69,6 +318,91 @@ class TestTimerFunctions(unittest.TestCase):
         self.assertRaises(ValueError, t.reset, -1)
 
 
+class TestEmitterFunctions(unittest.TestCase):
+
+    def test_connect(self):
+        t = pomodoro.Timer(2)
+        fired = []
+        i = t.connect('fire', lambda t, *args: fired.append(args), 'foo')
+
+        self.assertRaises(TypeError, t.connect, 'foo', lambda t: None)
+        t.tick()
+        t.tick()
+        self.assertEqual(fired, [('foo',)])
+        t.disconnect(i)
+        t.tick()
+        t.tick()
+        self.assertEqual(fired, [('foo',)])
+
+    def test_emit_error(self):
+        t = pomodoro.Timer(1)
+        fired = []
+        t.connect('fire', lambda t: 1 / 0)
+        t.connect('fire', lambda t: fired.append(t.count))
+
+        stderr = sys.stderr
+        sys.stderr = tempfile.TemporaryFile('w+')
+        try:
+            t.tick()
+            sys.stderr.seek(0)
+            self.assertTrue('ZeroDivisionError' in sys.stderr.read())
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        self.assertEqual(fired, [0])
+
+    def test_adapter(self):
+        c = pomodoro.Core()
+        a = pomodoro.Adapter(c)
+        phases = []
+        a.connect('phase-fraction',
+                  lambda a, name, phase, count, ticks:
+                      phases.append((a.current, name, phase, count, ticks)))
+
+        a.start()
+        self.assertEqual(phases, [('work', 'work', 1, 0,
+                                   pomodoro.WORK * pomodoro.TICKS)])
+
+
+class TestScheduleFunctions(unittest.TestCase):
+
+    def test_init(self):
+        s = pomodoro.DEFAULT
+
+        self.assertEqual(len(s), 8)
+        self.assertEqual(s.count, 4)
+        self.assertEqual(list(s.phases), [1, 1, 2, 2, 3, 3, 4, 4])
+        self.assertEqual(s.total, (4 * pomodoro.WORK + 3 * pomodoro.BREAK
+                                   + pomodoro.COFFEE) * pomodoro.TICKS)
+
+        self.assertRaises(ValueError, pomodoro.Schedule, [])
+        self.assertRaises(ValueError, pomodoro.Schedule, [('work', 0)])
+
+    def test_parse(self):
+        s = pomodoro.Schedule.parse("# long focus\n"
+                                    "work 50, break 10\n"
+                                    "work 50, coffee 30 # lunch\n")
+
+        self.assertEqual(s.names, ('work', 'break', 'work', 'coffee'))
+        self.assertEqual(list(s.durations),
+                         [m * 60 * pomodoro.TICKS for m in (50, 10, 50, 30)])
+        self.assertEqual(s.count, 2)
+
+        self.assertRaises(ValueError, pomodoro.Schedule.parse, "work")
+        self.assertRaises(ValueError, pomodoro.Schedule.parse, "work five")
+
+    def test_locate(self):
+        s = pomodoro.Schedule([('work', 10), ('break', 5)])
+        ticks = pomodoro.TICKS
+
+        self.assertEqual(s.locate(0), (0, 0))
+        self.assertEqual(s.locate(10 * ticks - 1), (0, 10 * ticks - 1))
+        self.assertEqual(s.locate(10 * ticks), (1, 0))
+        self.assertEqual(s.locate(15 * ticks), (0, 0))
+        self.assertEqual(s.locate(1000 * 15 * ticks + 12 * ticks),
+                         (1, 2 * ticks))
+
+
 class TestCoreFunctions(unittest.TestCase):
 
     def test_init(self):
@@ -175,21 +509,473 @@ class TestCoreFunctions(unittest.TestCase):
         self.assertEqual(c.current, 'work')
         self.assertEqual(c.phase, 1)
 
+    def test_advance(self):
+        c = pomodoro.Core()
+        t = pomodoro.Core()
 
+        self.assertRaises(pomodoro.NotYetStarted, c.advance, 1)
+
+        c.start()
+        t.start()
+        self.assertRaises(ValueError, c.advance, -1)
+        for seconds in (1, pomodoro.WORK - 1, 1, pomodoro.BREAK + 10,
+                        3 * pomodoro.WORK + 2 * pomodoro.BREAK):
+            c.advance(seconds)
+            [t.tick() for j in xrange(seconds * pomodoro.TICKS)]
+            self.assertEqual(c.current, t.current)
+            self.assertEqual(c.phase, t.phase)
+            self.assertEqual(c.timers[c.current].count,
+                             t.timers[t.current].count)
+
+    def test_advance_nothing(self):
+        c = pomodoro.Core()
+        signals = []
+        c.connect('phase-fraction',
+                  lambda core, name, phase, count, ticks:
+                      signals.append(count))
+
+        c.start()
+        c.advance(0)
+        c.advance(0.4 / pomodoro.TICKS)
+        c.advance(0, boundaries=False)
+        self.assertEqual(signals, [0])
+        self.assertEqual(c.state, (0, 1, 0))
+
+    def test_advance_boundaries(self):
+        c = pomodoro.Core()
+        signals = []
+        c.connect('phase-fraction', lambda core, *args: signals.append(args))
+
+        c.start()
+        del signals[:]
+        c.advance(pomodoro.WORK + 1)
+        self.assertEqual(signals,
+                         [('work', 1, pomodoro.WORK, pomodoro.WORK),
+                          ('break', 1, 0, pomodoro.BREAK),
+                          ('break', 1, 1, pomodoro.BREAK)])
+
+        del signals[:]
+        c.advance(24 * 60 * 60, boundaries=False)
+        self.assertEqual(len(signals), 1)
+        # 1 day = 11 cycles of 125 minutes, plus 65 minutes
+        self.assertEqual(c.current, 'work')
+        self.assertEqual(c.phase, 4)
+        self.assertEqual(c.timers[c.current].count, 1)
+
+    def test_state(self):
+        c = pomodoro.Core()
+
+        self.assertEqual(c.state, (None, 0, 0))
+        c.start()
+        c.advance(pomodoro.WORK + pomodoro.BREAK + 10)
+        self.assertEqual(c.state, (2, 2, 10))
+
+        t = pomodoro.Core()
+        t.set_state(*c.state)
+        self.assertEqual(t.current, 'work')
+        self.assertEqual(t.phase, 2)
+        self.assertEqual(t.timers[t.current].count, 10)
+        t.skip()
+        self.assertEqual(t.state, (3, 2, 0))
+        t.set_state(None, 0, 0)
+        self.assertTrue(t.current is None)
+
+        self.assertRaises(ValueError, t.set_state, 8, 1, 0)
+        self.assertRaises(ValueError, t.set_state, 0, 1, pomodoro.WORK)
+        self.assertRaises(ValueError, t.set_state, 2, 1, 0)
+
+    def test_schedule(self):
+        c = pomodoro.Core(pomodoro.Schedule.parse("work 50, break 10, "
+                                                  "work 50, coffee 30"))
+        phases = []
+        c.connect('phase-fraction',
+                  lambda c, name, phase, count, ticks:
+                      phases.append((name, phase, ticks)) if not count
+                      else None)
+
+        c.start()
+        [c.skip() for i in xrange(4)]
+        self.assertEqual(phases, [('work', 1, 3000 * pomodoro.TICKS),
+                                  ('break', 1, 600 * pomodoro.TICKS),
+                                  ('work', 2, 3000 * pomodoro.TICKS),
+                                  ('coffee', 2, 1800 * pomodoro.TICKS),
+                                  ('work', 1, 3000 * pomodoro.TICKS)])
+        c.advance(3000 + 600 + 60, boundaries=False)
+        self.assertEqual(c.state, (2, 2, 60 * pomodoro.TICKS))
+
+    def test_remaining(self):
+        c = pomodoro.Core()
+
+        self.assertRaises(pomodoro.NotYetStarted, c.remaining)
+
+        c.start()
+        self.assertEqual(c.remaining(), pomodoro.WORK * pomodoro.TICKS)
+        c.tick()
+        self.assertEqual(c.remaining(), pomodoro.WORK * pomodoro.TICKS - 1)
+        c.skip()
+        self.assertEqual(c.remaining(), pomodoro.BREAK * pomodoro.TICKS)
+
+
+class TestPhaseFractionFunctions(unittest.TestCase):
+
+    class Spy(object):
+        """Record the calls of any method."""
+
+        label = 'foo'
+        lag = 0
+
+        def __init__(self, calls):
+            self.calls = calls
+
+        def __getattr__(self, name):
+            return lambda *args: self.calls.append((name,) + args[:1])
+
+    def test_schedule(self):
+        c = pomodoro.Core(pomodoro.Schedule.parse("focus 50, rest 10"))
+        calls = []
+        spy = self.Spy(calls)
+        c.connect('phase-fraction', pomodoro._phase_fraction_cb,
+                  spy, spy, spy, spy, spy, spy)
+
+        c.start()
+        c.advance(50 * 60)
+        self.assertEqual(calls[:3], [('set_text', 'focus 50m:0s'),
+                                     ('set_fraction', 0.0),
+                                     ('set_title', 'Pomodoro 1/1')])
+        self.assertTrue(('start', 'focus') in calls)
+        self.assertTrue(('append', 'foo') in calls)
+        self.assertTrue(('add', u'foo') in calls)
+        self.assertFalse(('begin_toggle',) in calls)
+        del calls[:]
+        c.advance(10 * 60)
+        self.assertTrue(('begin_toggle',) in calls)
+        self.assertFalse(('append', 'foo') in calls)
+
+    def test_restore(self):
+        c = pomodoro.Core()
+        calls = []
+        spy = self.Spy(calls)
+        c.connect('phase-fraction', pomodoro._phase_fraction_cb,
+                  spy, spy, spy, spy, spy, spy)
+
+        # e.g. saved suspended at the beginning of the second pomodoro.
+        c.set_state(2, 2, 0)
+        self.assertEqual(calls, [('set_text', 'work 25m:0s'),
+                                 ('set_fraction', 0.0),
+                                 ('set_title', 'Pomodoro 2/4')])
+        self.assertFalse(c.restoring)
+
+
+class TestSessionManagerFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.m = sessions.SessionManager(lambda: self.now)
+
+    def test_start(self):
+        self.m.start('foo')
+        self.assertEqual(self.m.query('foo'),
+                         ('work', 1, 0, pomodoro.WORK, True))
+        self.assertEqual(self.m.next_deadline(), pomodoro.WORK)
+
+        self.assertRaises(pomodoro.AlreadyStarted, self.m.start, 'foo')
+
+    def test_suspend(self):
+        self.assertRaises(KeyError, self.m.suspend, 'foo')
+
+        self.m.start('foo')
+        self.now = 10
+        self.m.suspend('foo')
+        self.assertTrue(self.m.next_deadline() is None)
+        self.now = 100
+        self.assertEqual(self.m.query('foo'),
+                         ('work', 1, 10, pomodoro.WORK, False))
+
+        self.assertRaises(pomodoro.NotYetStarted, self.m.suspend, 'foo')
+
+        self.m.start('foo')
+        self.assertEqual(self.m.next_deadline(), 100 + pomodoro.WORK - 10)
+
+    def test_skip(self):
+        self.m.start('foo')
+        self.m.skip('foo')
+        self.assertEqual(self.m.query('foo'),
+                         ('break', 1, 0, pomodoro.BREAK, True))
+        self.assertEqual(self.m.next_deadline(), pomodoro.BREAK)
+
+    def test_poll(self):
+        phases = []
+        self.m.connect('phase', lambda m, *args: phases.append(args))
+
+        for sid in xrange(1000):
+            self.now = sid
+            self.m.start(sid)
+        self.now = pomodoro.WORK + 99
+        self.assertEqual(self.m.poll(), pomodoro.WORK + 100)
+        self.assertEqual(len(phases), 100)
+        self.assertEqual(phases[0], (0, 'break', 1))
+        self.assertEqual(self.m.query(0),
+                         ('break', 1, 99, pomodoro.BREAK, True))
+
+        # at the end of a break, the next pomodoro has to be started manually
+        self.now = pomodoro.WORK + pomodoro.BREAK
+        self.m.poll()
+        self.assertEqual(self.m.query(0),
+                         ('work', 2, 0, pomodoro.WORK, False))
+
+    def test_stop(self):
+        self.m.start('foo')
+        self.m.stop('foo')
+        self.assertFalse('foo' in self.m)
+        self.assertTrue(self.m.next_deadline() is None)
+
+
+class TestProbeFunctions(unittest.TestCase):
+
+    def test_histogram(self):
+        h = probe.Histogram()
+
+        h.add(-0.001)
+        h.add(0.00001)
+        h.add(0.5)
+        h.add(3600)
+        self.assertEqual(h.count, 4)
+        self.assertEqual(h.min, -0.001)
+        self.assertEqual(h.max, 3600)
+        self.assertEqual(h.counts[0], 2)
+        self.assertEqual(h.counts[-1], 1)
+        self.assertEqual(sum(h.counts), 4)
+
+    def test_wrap(self):
+        p = probe.Probe()
+
+        handler = p.wrap('foo', lambda a, b: a + b)
+        self.assertEqual(handler(1, 2), 3)
+        self.assertEqual(p.histograms['foo'].count, 1)
+
+    def test_clock(self):
+        p = probe.Probe()
+        clk = pomodoro.Clock()
+
+        clk.probe = p
+        clk.start()
+        clk._tick()
+        clk.stop()
+        self.assertEqual(p.histograms['tick lateness'].count, 1)
+
+    def test_resync(self):
+        p = probe.Probe()
+        now = [0]
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c, lambda: now[0])
+        clk.connect('elapsed', pomodoro._elapsed_cb, c)
+
+        clk.probe = p
+        clk.set_visible(False)
+        c.start()
+        clk.start()
+        # resync wakeups, a second late each, well before the deadline.
+        for i in xrange(5):
+            now[0] += mainloop.RESYNC + 1
+            clk._boundary_cb()
+        h = p.histograms['boundary lateness']
+        self.assertEqual(h.count, 5)
+        self.assertTrue(0.9 < h.min <= h.max < 1.1)
+
+
+class TestMetricsFunctions(unittest.TestCase):
+
+    def test_render(self):
+        c = pomodoro.Core()
+        clk = pomodoro.DeadlineClock(c, clock=lambda: self.now)
+        e = metrics.Exporter(c, clk)
+        self.now = 1000
+
+        self.assertTrue('pomodoro_phase_index 0\n' in e.render())
+        c.start()
+        c.advance(pomodoro.WORK)
+        clk.start()
+        self.now += 60
+        text = e.render()
+        self.assertTrue('pomodoro_phase{name="break"} 1\n' in text)
+        self.assertTrue('pomodoro_phase_index 1\n' in text)
+        self.assertTrue('pomodoro_remaining_seconds %d\n'
+                        % (pomodoro.BREAK - 60,) in text)
+        self.assertTrue('pomodoro_running 1\n' in text)
+        self.assertTrue('pomodoro_completed_total{name="work"} 1\n' in text)
+
+    def test_parse(self):
+        self.assertEqual(metrics.parse('9100'),
+                         (metrics.socket.AF_INET, ('127.0.0.1', 9100)))
+        self.assertEqual(metrics.parse('0.0.0.0:9100'),
+                         (metrics.socket.AF_INET, ('0.0.0.0', 9100)))
+        self.assertEqual(metrics.parse('/tmp/pomodoro.sock'),
+                         (metrics.socket.AF_UNIX, '/tmp/pomodoro.sock'))
+        self.assertRaises(ValueError, metrics.parse, 'localhost')
+
+    def test_server(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'metrics')
+            e = metrics.Exporter(pomodoro.Core())
+            # a stale socket is replaced, ...
+            metrics.socket.socket(metrics.socket.AF_UNIX).bind(path)
+            s = metrics.Server(e, path)
+            self.assertTrue(s.respond(b'GET / HTTP/1.0\r\n\r\n')
+                            .startswith(b'HTTP/1.0 200 OK\r\n'))
+            s.close()
+            # ... anything else is left alone.
+            with open(path, 'w') as f:
+                f.write('precious')
+            self.assertRaises(ValueError, metrics.Server, e, path)
+            with open(path) as f:
+                self.assertEqual(f.read(), 'precious')
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestRemoteFunctions(unittest.TestCase):
+
+    class FakeUI(object):
+
+        def __init__(self):
+            self.calls = []
+
+        def __getattr__(self, name):
+            return lambda *args: self.calls.append((name,) + args)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'socket')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_send(self):
+        self.assertTrue(remote.send('skip', path=self.path) is None)
+
+    def test_running(self):
+        self.assertFalse(remote.running(self.path))
+        l = remote.Listener(self.path)
+        self.assertTrue(remote.running(self.path))
+        l.close()
+        self.assertFalse(remote.running(self.path))
+
+    def test_listener(self):
+        l = remote.Listener(self.path)
+        self.assertRaises(pomodoro.AlreadyStarted, remote.Listener, self.path)
+        l.close()
+        self.assertFalse(os.path.exists(self.path))
+
+        # the socket of a crashed instance is replaced.
+        l = remote.Listener(self.path)
+        l.sock.close()
+        l = remote.Listener(self.path)
+        l.close()
+
+    def test_dispatch(self):
+        l = remote.Listener(self.path)
+        self.assertEqual(l.dispatch('skip'), 'not ready')
+        ui = self.FakeUI()
+        l.ui = ui
+
+        self.assertEqual(l.dispatch('skip'), 'ok')
+        self.assertEqual(l.dispatch('toggle'), 'ok')
+        self.assertEqual(l.dispatch('label foo bar'), 'ok')
+        self.assertEqual(l.dispatch('quit'), 'unknown command: quit')
+        self.assertEqual(ui.calls, [('skip',), ('begin_toggle',),
+                                    ('set_label', 'foo bar')])
+        l.close()
+
+    def test_respond(self):
+        l = remote.Listener(self.path)
+        ui = self.FakeUI()
+        l.attach(ui)
+
+        self.assertTrue(l.respond(b'ski') is None)
+        self.assertEqual(l.respond(b'skip\nignored'), 'ok\n')
+        self.assertEqual(ui.calls, [('skip',)])
+        (conn, client) = remote.socket.socketpair()
+        try:
+            conn.setblocking(False)
+            client.sendall(b'toggle')
+            self.assertTrue(l._read_cb(conn, 0, [b'']))
+            self.assertFalse(l._write_cb(conn, 0, [b'ok\n']))
+            self.assertEqual(client.recv(16), b'ok\n')
+        finally:
+            conn.close()
+            client.close()
+        l.close()
+
+
+class TestSnapshotFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'state')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_save(self):
+        c = pomodoro.Core()
+
+        c.start()
+        c.advance(pomodoro.WORK + 10)
+        snapshot.save(c, self.path)
+        self.assertEqual(os.path.getsize(self.path), snapshot.LAYOUT.size)
+        self.assertEqual(snapshot.load(self.path)[:3], (1, 1, 10))
+
+        t = pomodoro.Core()
+        self.assertTrue(snapshot.restore(t, self.path))
+        self.assertEqual(t.state, c.state)
+
+    def test_long_schedule(self):
+        schedule = pomodoro.Schedule([('work', 1), ('break', 1)] * 150)
+        c = pomodoro.Core(schedule)
+
+        c.start()
+        c.advance(201)
+        snapshot.save(c, self.path)
+        self.assertEqual(snapshot.load(self.path)[:3], (201, 101, 0))
+
+    def test_load(self):
+        self.assertTrue(snapshot.load(self.path) is None)
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertTrue(snapshot.load(self.path) is None)
+        self.assertFalse(snapshot.restore(pomodoro.Core(), self.path))
+
+    def test_snapshotter(self):
+        now = [0]
+        c = pomodoro.Core()
+        s = snapshot.Snapshotter(c, self.path, 60, lambda: now[0])
+
+        c.start()
+        self.assertEqual(snapshot.load(self.path)[:3], (0, 1, 0))
+        now[0] = 30
+        c.advance(30)
+        self.assertEqual(snapshot.load(self.path)[:3], (0, 1, 0))
+        now[0] = 60
+        c.advance(30)
+        self.assertEqual(snapshot.load(self.path)[:3], (0, 1, 60))
+
+
+@unittest.skipIf(gui is None, 'gtk or pygame not available')
 class TestUIFunctions(unittest.TestCase):
 
     def test_init(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         button = ui.buttons['begin']
 
     def test_buzz(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         ui.buzz()
 
     def test_begin_cb(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         button = ui.buttons['begin']
         self.assertEqual(button.get_children()[0], ui.images['play'])
@@ -201,24 +987,24 @@ class TestUIFunctions(unittest.TestCase):
         self.assertEqual(button.get_children()[0], ui.images['pause'])
 
     def test_skip(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
         
         ui.skip()
 
     def test_set_title(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         ui.set_text('foo')
         self.assertEqual(ui.text, 'foo')
 
     def test_set_text(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         ui.set_text('foo')
         self.assertEqual(ui.text, 'foo')
 
     def test_set_fraction(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         ui.set_fraction(0.5)
         self.assertEqual(ui.fraction, 0.5)
@@ -227,21 +1013,59 @@ class TestUIFunctions(unittest.TestCase):
         self.assertRaises(ValueError, ui.set_fraction, 1.1)
 
     def test_set_label(self):
-        ui = pomodoro.UI()
+        ui = gui.UI()
 
         ui.set_label('foo')
         self.assertEqual(ui.label, 'foo')
 
 
+@unittest.skipIf(gui is None, 'gtk or pygame not available')
+class TestRendererFunctions(unittest.TestCase):
+
+    def test_set_text(self):
+        ui = gui.UI()
+        r = gui.Renderer(ui)
+
+        r.set_text('foo')
+        self.assertEqual(ui.text, 'foo')
+
+        ui.set_text('bar')
+        r.set_text('foo')
+        self.assertEqual(ui.text, 'bar')
+
+    def test_set_fraction(self):
+        ui = gui.UI()
+        r = gui.Renderer(ui)
+
+        r.set_fraction(0.5)
+        self.assertEqual(ui.fraction, 0.5)
+
+        self.assertRaises(ValueError, r.set_fraction, -1)
+        self.assertRaises(ValueError, r.set_fraction, 1.1)
+
+    def test_visible(self):
+        ui = gui.UI()
+        r = gui.Renderer(ui)
+
+        ui.emit('visible', False)
+        r.set_text('foo')
+        r.set_title('bar')
+        self.assertNotEqual(ui.text, 'foo')
+        self.assertEqual(ui.title, 'bar')
+        ui.emit('visible', True)
+        self.assertEqual(ui.text, 'foo')
+
+
+@unittest.skipIf(gui is None, 'gtk or pygame not available')
 class TestPlayerFunctions(unittest.TestCase):
 
     def test_init(self):
-        p = pomodoro.Player()
+        p = gui.Player()
 
         self.assertEqual(p.started, False)
 
     def test_start(self):
-        p = pomodoro.Player()
+        p = gui.Player()
 
         p.start()
         self.assertEqual(p.started, True)
@@ -249,7 +1073,7 @@ class TestPlayerFunctions(unittest.TestCase):
         self.assertRaises(pomodoro.AlreadyStarted, p.start)
 
     def test_stop(self):
-        p = pomodoro.Player()
+        p = gui.Player()
         
         p.start()
         p.stop()
@@ -257,6 +1081,456 @@ class TestPlayerFunctions(unittest.TestCase):
 
         self.assertRaises(pomodoro.NotYetStarted, p.stop)
 
+    def test_close(self):
+        p = gui.Player()
+
+        p.start()
+        p.close()
+        self.assertEqual(p.started, False)
+        self.assertTrue(p.closing is None)
+        self.assertTrue(gui.pygame.mixer.get_init() is None)
+
+        p.start()
+        self.assertEqual(p.started, True)
+        p.close()
+
+    def test_tones(self):
+        samples = gui.synthesize([(1000, 0.001)], 8000, -16, 2)
+        self.assertEqual(len(samples), 16)
+        self.assertEqual(samples[0::2], samples[1::2])
+        self.assertEqual(samples[0], 0)
+        self.assertEqual(gui.synthesize([(1000, 0.001)], 8000, 8, 1)[0], 128)
+
+        p = gui.Player()
+        self.assertNotEqual(p.bank.buffer('work'), p.bank.buffer('break'))
+        self.assertEqual(p.bank.buffer('foo'), p.bank.default)
+
+        p.start('work')
+        p.stop()
+        p.start('break')
+        self.assertEqual(sorted(p.sounds), ['break', 'work'])
+        p.close()
+
+class TestHistoryFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp, 'history')
+        with open(self.log, 'w') as f:
+            f.write("2012-01-02 10:00:00.123456 | foo\n"
+                    "2012-01-02 11:00:00 | bar\n"
+                    "2012-01-09 10:00:00.5 | foo\n")
+        self.h = history.History(os.path.join(self.tmp, 'history.db'))
+
+    def tearDown(self):
+        self.h.close()
+        shutil.rmtree(self.tmp)
+
+    def test_writer(self):
+        w = history.Writer(self.log, size=2)
+        w.append('bar', datetime.datetime(2012, 1, 10, 10))
+        [w.append('baz') for i in xrange(10)]
+        w.close()
+
+        self.assertEqual(self.h.sync(self.log), 14)
+        self.assertEqual(self.h.per_label(),
+                         [('bar', 2), ('baz', 10), ('foo', 2)])
+
+    def test_writer_error(self):
+        w = history.Writer(self.log, size=2)
+        class Broken(object):
+            fileno = w.f.fileno
+            def write(self, data):
+                raise IOError(errno.EIO, 'broken')
+            def close(self):
+                pass
+        w.f = Broken()
+        w.append('bar')
+        [w.append('baz') for i in xrange(10)]
+        self.assertRaises(IOError, w.close)
+        self.assertTrue(w.lost >= 1)
+
+        # the worker opened the log again after the failure.
+        self.assertEqual(self.h.sync(self.log), 3 + 11 - w.lost)
+        # a stopped worker never blocks the caller.
+        self.assertRaises(IOError, w.append, 'baz')
+
+    def test_writer_replaced(self):
+        w = history.Writer(self.log, fsync=False)
+        # e.g. rotated by `compact' while the writer is running.
+        os.rename(self.log, self.log + '.old')
+        with open(self.log, 'w') as f:
+            f.write("2012-01-09 10:00:00.5 | foo\n")
+        w.append('baz')
+        w.close()
+
+        self.assertEqual(self.h.sync(self.log), 2)
+        self.assertEqual(self.h.count(label='baz'), 1)
+
+    def test_parse(self):
+        self.assertEqual(history.parse("2012-01-02 10:00:00.000001 | a | b\n"),
+                         (datetime.datetime(2012, 1, 2, 10, 0, 0, 1), 'a | b'))
+        self.assertEqual(history.parse("2012-01-02 10:00:00 | a"),
+                         (datetime.datetime(2012, 1, 2, 10, 0, 0), 'a'))
+
+        self.assertRaises(ValueError, history.parse, "foo")
+        self.assertRaises(ValueError, history.parse, "foo | bar")
+
+    def test_sync(self):
+        self.assertEqual(self.h.sync(self.log), 3)
+        self.assertEqual(self.h.sync(self.log), 0)
+        with open(self.log, 'a') as f:
+            f.write("2012-01-10 10:00:00 | baz\n2012-01-10 11:")
+        self.assertEqual(self.h.sync(self.log), 1)
+        self.assertEqual(self.h.count(), 4)
+
+    def test_sync_undecodable(self):
+        with open(self.log, 'a') as f:
+            f.write("2012-01-10 10:00:00 | caf\xe9\n"
+                    "2012-01-10 11:00:00 | baz\n")
+        self.assertEqual(self.h.sync(self.log), 4)
+        self.assertEqual(self.h.sync(self.log), 0)
+
+    def test_per_week(self):
+        # a week spanning new year is not split.
+        self.h.add(datetime.datetime(2024, 12, 31, 12), 'foo')
+        self.h.add(datetime.datetime(2025, 1, 1, 12), 'foo')
+        self.h.add(datetime.datetime(2025, 1, 5, 12), 'foo')
+        self.h.add(datetime.datetime(2025, 1, 6, 12), 'foo')
+
+        self.assertEqual(self.h.per_week(),
+                         [('2024-12-30', 3), ('2025-01-06', 1)])
+
+    def test_add(self):
+        self.h.add(datetime.datetime(2012, 1, 2, 12), 'foo')
+        self.h.add(datetime.datetime(2012, 1, 3, 12), 'foo')
+
+        self.assertEqual(self.h.count(), 2)
+        self.assertEqual(self.h.count(label='foo'), 2)
+
+    def test_queries(self):
+        self.h.sync(self.log)
+
+        self.assertEqual(self.h.per_day(),
+                         [('2012-01-02', 2), ('2012-01-09', 1)])
+        self.assertEqual(self.h.per_week(),
+                         [('2012-01-02', 2), ('2012-01-09', 1)])
+        self.assertEqual(self.h.per_label(), [('bar', 1), ('foo', 2)])
+        self.assertEqual(self.h.per_label(start=datetime.date(2012, 1, 3)),
+                         [('foo', 1)])
+        self.assertEqual(self.h.count(end=datetime.date(2012, 1, 3)), 2)
+        self.assertEqual(self.h.count(label='bar'), 1)
+
+class TestStatsFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp, 'history')
+        with open(self.log, 'w') as f:
+            f.write("2012-01-02 10:00:00.123456 | foo\n"
+                    "2012-01-02 11:00:00 | bar\n"
+                    "garbage\n"
+                    "2012-01-05 10:00:00 | caf\xe9\n"
+                    "2012-01-09 10:00:00.5 | foo\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_update(self):
+        s = stats.Stats()
+
+        self.assertEqual(s.update(self.log), 3)
+        self.assertEqual(s.days, {'2012-01-02': 2, '2012-01-09': 1})
+        self.assertEqual(s.labels, {'foo': 2, 'bar': 1})
+        self.assertEqual(s.hours, {'10': 2, '11': 1})
+
+        self.assertEqual(s.update(self.log), 0)
+        with open(self.log, 'a') as f:
+            f.write("2012-01-10 12:00:00 | foo\n2012-01-10")
+        self.assertEqual(s.update(self.log), 1)
+        self.assertEqual(s.labels['foo'], 3)
+
+    def test_checkpoint(self):
+        checkpoint = os.path.join(self.tmp, 'checkpoint')
+        stats.Stats(checkpoint).update(self.log)
+        with open(self.log, 'a') as f:
+            f.write("2012-01-10 12:00:00 | foo\n")
+
+        s = stats.Stats(checkpoint)
+        self.assertEqual(s.update(self.log), 1)
+        self.assertEqual(s.labels, {'foo': 3, 'bar': 1})
+
+
+class TestEventsFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'events')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_record(self):
+        self.assertEqual(list(events.read(self.path)), [])
+
+        events.record(events.BEGIN, 100.5, self.path)
+        events.record(events.SKIP, 200.25, self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'garbage')
+        self.assertEqual(list(events.read(self.path)),
+                         [(100.5, events.BEGIN), (200.25, events.SKIP)])
+
+    def test_replay(self):
+        schedule = pomodoro.Schedule([('work', 10), ('break', 5)] * 2)
+        r = events.Replay(schedule)
+
+        timeline = r.run([(100, events.BEGIN), (113, events.SKIP),
+                          (130, events.BEGIN), (134, events.SUSPEND),
+                          (140, events.BEGIN), (200, events.CLOSE)])
+        self.assertEqual(timeline, [('work', 1, 100, 110, 10, 10, 'done'),
+                                    ('break', 1, 110, 113, 3, 5, 'skipped'),
+                                    ('work', 2, 113, 123, 10, 10, 'done'),
+                                    ('break', 2, 123, 128, 5, 5, 'done'),
+                                    ('work', 1, 128, 146, 10, 10, 'done'),
+                                    ('break', 1, 146, 151, 5, 5, 'done')])
+        self.assertEqual((r.index, r.running), (2, False))
+
+        r.run([(300, events.BEGIN)], now=304)
+        self.assertEqual((r.index, r.elapsed, r.running), (2, 4, True))
+
+
+class TestArchiveFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp, 'history')
+        self.lines = ["2012-01-02 10:00:00.123456 | foo\n",
+                      "2012-01-31 23:00:00 | bar\n",
+                      "garbage\n",
+                      "2012-02-09 10:00:00.5 | foo\n",
+                      "2012-03-01 09:00:00 | foo\n"]
+        with open(self.log, 'w') as f:
+            f.writelines(self.lines)
+            f.write("2012-03-01 10:00")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_rotate(self):
+        self.assertEqual(archive.rotate(self.log, datetime.date(2012, 1, 20)),
+                         [])
+        self.assertEqual(archive.rotate(self.log, datetime.date(2012, 3, 1)),
+                         ['2012-01', '2012-02'])
+        with open(self.log) as f:
+            self.assertEqual(f.read(), self.lines[4] + "2012-03-01 10:00")
+        self.assertEqual(archive.months(self.log), ['2012-01', '2012-02'])
+        self.assertEqual(archive.lines(self.log, '2012-01'),
+                         [l.rstrip('\n') for l in self.lines[:3]])
+
+        summary = archive.load(self.log, '2012-01')
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['days'], {'2012-01-02': 1, '2012-01-31': 1})
+        self.assertEqual(summary['labels'], {'foo': 1, 'bar': 1})
+
+        # sealing again the same records is harmless.
+        with open(self.log, 'w') as f:
+            f.writelines(self.lines[1:2] + ["2012-01-05 10:00:00 | baz\n"])
+        self.assertEqual(archive.rotate(self.log, datetime.date(2012, 3, 1)),
+                         ['2012-01'])
+        self.assertEqual(archive.load(self.log, '2012-01')['count'], 3)
+
+    def test_iterlines(self):
+        archive.rotate(self.log, datetime.date(2012, 3, 1))
+
+        self.assertEqual(list(archive.iterlines(self.log)),
+                         [l.rstrip('\n') for l in self.lines])
+        self.assertEqual(list(archive.iterlines(self.log, sealed=False)),
+                         [self.lines[4].rstrip('\n')])
+        self.assertEqual(list(archive.iterlines(self.log, b"foo\nbar",
+                                                sealed=False)), [b"foo"])
+
+    def test_rotate_undecodable(self):
+        with open(self.log, 'w') as f:
+            f.write("2012-01-02 10:00:00 | caf\xe9\n"
+                    "2012-01-03 10:00:00 | foo\n")
+        self.assertEqual(archive.rotate(self.log, datetime.date(2012, 3, 1)),
+                         ['2012-01'])
+        # the line is sealed, but not counted.
+        self.assertEqual(len(archive.lines(self.log, '2012-01')), 2)
+        self.assertEqual(archive.load(self.log, '2012-01')['labels'],
+                         {'foo': 1})
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         ['history', 'history.2012-01.gz',
+                          'history.2012-01.json'])
+
+    def test_counts(self):
+        archive.rotate(self.log, datetime.date(2012, 3, 1))
+
+        self.assertEqual(archive.counts(self.log)['labels'],
+                         {'foo': 2, 'bar': 1})
+        total = archive.counts(self.log, start=datetime.date(2012, 1, 10),
+                               end=datetime.date(2012, 3, 1))
+        self.assertEqual(total['count'], 2)
+        self.assertEqual(total['labels'], {'foo': 1, 'bar': 1})
+
+    def test_history(self):
+        h = history.History(':memory:')
+        h.sync(self.log)
+        archive.rotate(self.log, datetime.date(2012, 3, 1))
+
+        self.assertEqual(h.sync(self.log), 4)
+        self.assertEqual(h.count(), 4)
+
+    def test_history_grown(self):
+        h = history.History(':memory:')
+        h.sync(self.log)
+        # the rotated log is longer than what already imported.
+        with open(self.log, 'a') as f:
+            f.write("\n")
+            f.writelines("2012-03-%02d 10:00:00 | baz\n" % (day,)
+                         for day in xrange(2, 12))
+        archive.rotate(self.log, datetime.date(2012, 3, 15))
+
+        self.assertEqual(h.sync(self.log), 14)
+        self.assertEqual(h.count(), 14)
+        self.assertEqual(h.count(label='baz'), 10)
+
+
+class TestReportFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logs = []
+        for (name, lines) in (('alice', ["2012-01-02 10:00:00 | foo\n",
+                                         "2012-02-02 10:00:00 | foo\n"]),
+                              ('bob', ["2012-01-02 10:00:00 | bar\n",
+                                       "garbage\n",
+                                       "2012-01-02 10:30:00 | caf\xe9\n",
+                                       "2012-01-02 11:00:00 | foo\n"])):
+            os.mkdir(os.path.join(self.tmp, name))
+            log = os.path.join(self.tmp, name, '.pomodoro_history')
+            with open(log, 'w') as f:
+                f.writelines(lines)
+            self.logs.append(log)
+        archive.rotate(self.logs[0], datetime.date(2012, 2, 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_aggregate(self):
+        self.assertEqual(report.user(self.logs[0]), 'alice')
+        self.assertEqual(report.user('/tmp/carol.log'), 'carol.log')
+
+        counts = report.aggregate(self.logs)
+        self.assertEqual(counts, {'alice': {('2012-01-02', 'foo'): 1,
+                                            ('2012-02-02', 'foo'): 1},
+                                  'bob': {('2012-01-02', 'bar'): 1,
+                                          ('2012-01-02', 'foo'): 1}})
+        self.assertEqual(report.aggregate(self.logs, start='2012-02-01'),
+                         {'alice': {('2012-02-02', 'foo'): 1}, 'bob': {}})
+
+    def test_run(self):
+        self.assertEqual(report.run(self.logs, processes=2),
+                         report.aggregate(self.logs))
+
+
+class TestExportFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp, 'history')
+        self.columns = os.path.join(self.tmp, 'columns')
+        with open(self.log, 'w') as f:
+            f.write("2012-01-02 10:00:00.123456 | foo\n"
+                    "2012-01-02 11:00:00 | bar\n"
+                    "garbage\n"
+                    "2012-02-09 10:00:00.5 | foo\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def epoch(self, *args):
+        return int(time.mktime(datetime.datetime(*args).timetuple()))
+
+    def test_update(self):
+        e = export.Exporter(self.columns)
+        self.assertEqual(e.update(self.log), 3)
+        self.assertEqual(e.labels, ['foo', 'bar'])
+        (timestamps, labels) = e.columns()
+        self.assertEqual(list(timestamps), [self.epoch(2012, 1, 2, 10),
+                                            self.epoch(2012, 1, 2, 11),
+                                            self.epoch(2012, 2, 9, 10)])
+        self.assertEqual(list(labels), [0, 1, 0])
+
+        with open(self.log, 'a') as f:
+            f.write("2012-02-10 12:00:00 | baz\n2012-02-10")
+        e = export.Exporter(self.columns)
+        self.assertEqual(e.update(self.log), 1)
+        self.assertEqual(e.labels, ['foo', 'bar', 'baz'])
+        self.assertEqual(list(e.columns()[1]), [0, 1, 0, 2])
+        self.assertEqual(os.path.getsize(os.path.join(self.columns,
+                                                      'timestamps')), 4 * 8)
+
+    def test_rotate(self):
+        export.Exporter(self.columns).update(self.log)
+        archive.rotate(self.log, datetime.date(2012, 2, 1))
+
+        e = export.Exporter(self.columns)
+        self.assertEqual(e.update(self.log), 3)
+        self.assertEqual(e.count, 3)
+        self.assertEqual(list(e.columns()[1]), [0, 1, 0])
+
+
+class TestCompleterFunctions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmp, 'history')
+        self.cache = os.path.join(self.tmp, 'labels')
+        with open(self.log, 'w') as f:
+            f.write("2012-01-02 10:00:00.123456 | foo\n"
+                    "2012-01-02 11:00:00 | foobar\n"
+                    "2012-01-03 11:00:00 | foobar\n"
+                    "2012-01-04 11:00:00 | #void\n"
+                    "garbage\n"
+                    "2012-02-09 10:00:00.5 | bar\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_complete(self):
+        c = complete.Completer(None)
+        day = 24 * 60 * 60
+
+        c.add(u'foo', 0)
+        c.add(u'foobar', 0)
+        c.add(u'foobar', 0)
+        self.assertEqual(c.complete(u'f'), [u'foobar', u'foo'])
+        self.assertEqual(c.complete(u'foob'), [u'foobar'])
+        self.assertEqual(c.complete(u'x'), [])
+        self.assertEqual(c.complete(u'f', limit=1), [u'foobar'])
+
+        # a single recent use beats two uses of three months ago.
+        c.add(u'foo', 90 * day)
+        self.assertEqual(c.complete(u''), [u'foo', u'foobar'])
+
+    def test_update(self):
+        c = complete.Completer(self.cache)
+        self.assertEqual(c.update(self.log), 5)
+        self.assertEqual(c.complete(u''), [u'bar', u'foobar', u'foo'])
+        c.save()
+
+        # uses added while running are not counted twice.
+        c.add(u'baz', time.mktime((2012, 2, 10, 10, 0, 0, 0, 0, -1)))
+        with open(self.log, 'a') as f:
+            f.write("2012-02-10 10:00:00.123 | baz\n")
+        self.assertEqual(c.update(self.log), 1)
+        self.assertEqual(c.ranks[u'baz'][1], 1)
+
+        c = complete.Completer(self.cache)
+        self.assertEqual(c.complete(u'foo'), [u'foobar', u'foo'])
+        self.assertEqual(c.update(self.log), 1)
+        self.assertEqual(c.complete(u'b'), [u'baz', u'bar'])
 
 
 if __name__ == '__main__':